@@ -0,0 +1,422 @@
+import argparse
+import asyncio
+import contextvars
+import itertools
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+import interactions
+
+from bench import suite
+from commands import autocomplete, base, modify, rolls, unstable
+from lib import (
+    constants,
+    dice,
+    misc,
+    sheets,
+    simulate,
+    spells,
+    wiki,
+    workers,
+)
+
+# how often a game night reaches for each command, keystrokes included
+MIX = {
+    "roll": 20,
+    "attack": 10,
+    "skill": 10,
+    "custom": 5,
+    "cast": 5,
+    "initiative": 3,
+    "chance": 2,
+    "eval": 2,
+    "dicestats": 1,
+    "modify": 2,
+    "save": 1,
+    "sort": 1,
+    "retrieve": 1,
+    "type spell": 5,
+    "type weapon": 5,
+    "type skill": 5,
+    "type custom": 2,
+}
+# seconds between keystrokes while someone types into an autocomplete
+TYPING = 0.15
+SKILLS = " ".join(str(n % 9) for n in range(18))
+ENTITIES = " ".join(f"Goblin{n}:{n + 3}" for n in range(8))
+
+# the simulated user whose command is running, for button presses
+USER: contextvars.ContextVar[int] = contextvars.ContextVar("user")
+IDS = itertools.count(1)
+
+
+def member(user: int) -> interactions.Member:
+    return interactions.Member(user=suite.author(user), nick=None, roles=[])
+
+
+class Recorder:
+    # stands in for discord, every call takes about one round trip
+    def __init__(self, latency: float, rng: random.Random):
+        self.latency = latency
+        self.rng = rng
+        self.calls: Counter[str] = Counter()
+
+    async def call(self, kind: str, kwargs: dict):
+        self.calls[kind] += 1
+        # the library serialises every embed before it goes out
+        embeds = kwargs.get("embeds") or kwargs.get("embed") or []
+        for embed in embeds if isinstance(embeds, list) else [embeds]:
+            embed._json
+        await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+
+
+class Context:
+    # the parts of CommandContext and ComponentContext commands touch
+    def __init__(self, recorder: Recorder, user: int, custom_id: str = ""):
+        self.id = next(IDS)
+        self.author = member(user)
+        self.user = self.author.user
+        self.data = SimpleNamespace(custom_id=custom_id)
+        self.responded: float | None = None
+        self.__recorder = recorder
+
+    async def send(self, **kwargs):
+        if self.responded is None:
+            self.responded = time.perf_counter()
+        await self.__recorder.call("send", kwargs)
+
+    async def edit(self, **kwargs):
+        await self.__recorder.call("edit", kwargs)
+
+    async def populate(self, choices: list):
+        if self.responded is None:
+            self.responded = time.perf_counter()
+        await self.__recorder.call("populate", {})
+
+
+class Client:
+    # just enough of interactions.Client for extensions to register against
+    def __init__(self, recorder: Recorder, think: float, idle: float):
+        self._commands = []
+        self._extensions = {}
+        self._websocket = SimpleNamespace(ready=asyncio.Event())
+        self._automate_sync = False
+        self.latency = recorder.latency * 1000
+        self.recorder = recorder
+        # mean seconds before a button is pressed, and how many never are
+        self.think = think
+        self.idle = idle
+
+    def event(self, coro, name=None):
+        return coro
+
+    def component(self, *args, **kwargs):
+        return lambda coro: coro
+
+    def autocomplete(self, *args, **kwargs):
+        return lambda coro: coro
+
+    def modal(self, *args, **kwargs):
+        return lambda coro: coro
+
+    def _Client__resolve_commands(self):
+        # only needed to sync with discord
+        pass
+
+    async def wait_for_component(self, components, check=None, timeout=None):
+        self.recorder.calls["component wait"] += 1
+        rng = self.recorder.rng
+        await asyncio.sleep(rng.expovariate(1 / self.think))
+        if rng.random() < self.idle:
+            # the real timeouts are minutes long, waiting them out is no use
+            raise asyncio.TimeoutError
+
+        buttons = []
+        for component in components:
+            buttons += getattr(component, "components", None) or [component]
+        pressed = rng.choice([b for b in buttons if b.custom_id])
+        button_ctx = Context(self.recorder, USER.get(), pressed.custom_id)
+        if check is not None and not await check(button_ctx):
+            raise asyncio.TimeoutError
+        return button_ctx
+
+
+class Extensions:
+    def __init__(self, client: Client):
+        self.rolls = rolls.RollCommands(client)
+        self.modify = modify.ModifyAttributes(client)
+        self.autocomplete = autocomplete.AutoComplete(client)
+        self.base = base.BaseCommands(client)
+        self.unstable = unstable.Unstable(client)
+
+    def command(self, name: str, ctx: Context, rng: random.Random):
+        match name:
+            case "roll":
+                return self.rolls.roll(
+                    ctx,
+                    rolls=rng.randint(1, 4),
+                    sides=rng.choice([4, 6, 8, 10, 12, 20]),
+                    mod=rng.randint(-1, 5),
+                    implication=rng.choice(["", "", "K", "k"]),
+                )
+            case "attack":
+                return self.rolls.attack(
+                    ctx, weapon=rng.choice(["Longsword", "Shortbow"])
+                )
+            case "skill":
+                return self.rolls.skill(ctx, skill=rng.choice(misc.stats))
+            case "custom":
+                return self.rolls.custom(ctx, custom="Sneak")
+            case "cast":
+                return self.rolls.cast(
+                    ctx, spell=rng.choice(spells.COMPENDIUM.spells)[0]
+                )
+            case "initiative":
+                return self.rolls.initiative(ctx)
+            case "chance":
+                return self.unstable.unstable(
+                    ctx,
+                    sub_command="chance",
+                    target=rng.randint(10, 20),
+                    expr=rng.choice(["1d20", "1d20+5", "2d6+3"]),
+                    implication=rng.choice(["", "adv", "dis", "ea"]),
+                )
+            case "eval":
+                return self.unstable.unstable(
+                    ctx, sub_command="eval", expr="1d8+4-1d6*1d6/1d6"
+                )
+            case "dicestats":
+                return self.rolls.roll_stats(
+                    ctx, dice=rng.choice(simulate.METHODS)
+                )
+            case "modify":
+                return self.modify.modify(
+                    ctx,
+                    sub_command="custom",
+                    key="Sneak",
+                    value=f"{rng.randint(1, 4)}d6",
+                )
+            case "save":
+                return self.modify.save(
+                    ctx, sub_command="skills", attributes=SKILLS
+                )
+            case "sort":
+                return self.base.sort(ctx, entities=ENTITIES)
+            case "retrieve":
+                return self.base.retrieve(ctx)
+        raise KeyError(name)
+
+    def keystrokes(self, name: str, rng: random.Random):
+        match name:
+            case "type spell":
+                word = rng.choice(spells.COMPENDIUM.spells)[0]
+                handler = self.autocomplete.cast_autocomplete
+            case "type weapon":
+                word = rng.choice(["Longsword", "Shortbow"])
+                handler = self.autocomplete.weapon_autocomplete
+            case "type skill":
+                word = rng.choice(misc.stats)
+                handler = self.autocomplete.skill_autocomplete
+            case "type custom":
+                word = "Sneak"
+                handler = self.autocomplete.custom_autocomplete
+            case _:
+                raise KeyError(name)
+        return handler, [word[:end].lower() for end in range(1, len(word) + 1)]
+
+
+class Stats:
+    def __init__(self):
+        self.respond: dict[str, list[float]] = {}
+        self.total: dict[str, list[float]] = {}
+        self.errors: Counter[str] = Counter()
+        self.failures: dict[str, str] = {}
+        self.lag: list[float] = []
+
+    async def time(self, name: str, ctx: Context, command):
+        started = time.perf_counter()
+        try:
+            await command
+        except Exception as exc:
+            self.errors[name] += 1
+            self.failures.setdefault(name, f"{type(exc).__name__}: {exc}")
+        finished = time.perf_counter()
+        responded = ctx.responded or finished
+        self.respond.setdefault(name, []).append(responded - started)
+        self.total.setdefault(name, []).append(finished - started)
+
+    async def watch(self, interval: float = 0.05):
+        # anything holding the loop shows up as oversleeping
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.lag.append(loop.time() - started - interval)
+
+
+def quantile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def seed_spells():
+    # /cast and its autocomplete are served from the saved pages
+    for fixture in sorted(suite.FIXTURES.glob("*.html")):
+        name, attrs = wiki.parse_spell(fixture.read_text(encoding="utf-8"))
+        slug = spells.slugify(name)
+        spells.COMPENDIUM.entries[slug] = {"name": name, "attrs": attrs}
+        spells.COMPENDIUM.spells.append((name, slug))
+    spells.SPELL_LIST = spells.SpellList(constants.CONFIG.spell_list)
+
+
+async def replay(
+    user: int,
+    extensions: Extensions,
+    recorder: Recorder,
+    stats: Stats,
+    mix: dict,
+    args,
+):
+    USER.set(user)
+    rng = random.Random(args.seed * 1_000_003 + user)
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration
+    await asyncio.sleep(rng.uniform(0, args.pace))
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        if name.startswith("type "):
+            handler, prefixes = extensions.keystrokes(name, rng)
+            for prefix in prefixes:
+                ctx = Context(recorder, user)
+                await stats.time(name, ctx, handler(ctx, prefix))
+                await asyncio.sleep(rng.expovariate(1 / TYPING))
+        else:
+            ctx = Context(recorder, user)
+            await stats.time(name, ctx, extensions.command(name, ctx, rng))
+        await asyncio.sleep(rng.expovariate(1 / args.pace))
+
+
+def report(stats: Stats, recorder: Recorder, args, elapsed: float):
+    count = sum(len(times) for times in stats.total.values())
+    print(
+        f"{args.users} users, {count} interactions in {elapsed:.1f}s "
+        f"({count / elapsed:.1f}/s)"
+    )
+    print(", ".join(f"{n} {kind}" for kind, n in recorder.calls.items()))
+    print(
+        f"{'interaction':<16}{'count':>7}{'errors':>8}"
+        f"{'respond p50':>13}{'p99':>9}{'total p50':>11}{'p99':>9}"
+    )
+    for name in sorted(stats.total):
+        respond, total = stats.respond[name], stats.total[name]
+        print(
+            f"{name:<16}{len(total):>7}{stats.errors[name]:>8}"
+            f"{quantile(respond, 0.5) * 1000:>11.1f}ms"
+            f"{quantile(respond, 0.99) * 1000:>7.1f}ms"
+            f"{quantile(total, 0.5) * 1000:>9.1f}ms"
+            f"{quantile(total, 0.99) * 1000:>7.1f}ms"
+        )
+    lag = stats.lag
+    print(
+        f"event loop lag p50 {quantile(lag, 0.5) * 1000:.1f}ms, "
+        f"p99 {quantile(lag, 0.99) * 1000:.1f}ms, "
+        f"max {max(lag, default=0) * 1000:.1f}ms"
+    )
+    for name, failure in sorted(stats.failures.items()):
+        print(f"{name} failed with {failure}")
+
+
+async def run(args) -> int:
+    recorder = Recorder(args.latency, random.Random(args.seed))
+    client = Client(recorder, args.think, args.idle)
+    extensions = Extensions(client)
+    seed_spells()
+    workers.start_server()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = Path(directory) / "stats.json"
+        suite.generate(filename, args.users)
+        constants.SHEETS = sheets.CharacterSheets(
+            sheets.open_backend(
+                "json", str(filename), constants.CONFIG.compact_after
+            ),
+            constants.CONFIG.flush_interval,
+        )
+        constants.SHEETS.start()
+
+        stats = Stats()
+        watcher = asyncio.create_task(stats.watch())
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[
+                replay(user, extensions, recorder, stats, args.mix, args)
+                for user in range(1, args.users + 1)
+            ]
+        )
+        # edits are sent in the background, let the last of them go out
+        while constants.OUTBOUND.pending:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        watcher.cancel()
+        await constants.SHEETS.flush()
+
+    await constants.WEB.close()
+    dice.ROLLERS.close()
+    constants.WORKERS.close()
+    report(stats, recorder, args, elapsed)
+    return 1 if stats.errors else 0
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in MIX:
+            raise argparse.ArgumentTypeError(f"unknown interaction {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay command traffic against the extensions offline."
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds of traffic"
+    )
+    parser.add_argument(
+        "--pace",
+        type=float,
+        default=5,
+        help="mean seconds between one user's interactions",
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=MIX,
+        help="weights such as roll=5,attack=2,type spell=1",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="seconds discord takes to answer each call",
+    )
+    parser.add_argument(
+        "--think", type=float, default=2, help="mean seconds to press a button"
+    )
+    parser.add_argument(
+        "--idle", type=float, default=0.1, help="share of buttons never pressed"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import interactions
+
+from lib import constants, dice, json_lib, misc, odds, sheets, wiki
+
+HERE = Path(__file__).parent
+FIXTURES = HERE / "fixtures"
+# ops/s only mean something on the machine that measured them, so every
+# machine keeps its own, out of git
+BASELINES = HERE / "baselines" / f"{platform.node() or 'local'}.json"
+
+# users in each generated stats.json
+SIZES = [100, 10_000, 100_000]
+# every case runs at least this long so one slow call can't skew it
+DURATION = 0.5
+# the duration is split into rounds and the fastest one counts, like timeit,
+# so a busy moment on the machine isn't taken for a regression
+ROUNDS = 3
+# one of each kind of group, plus one the parser hands to rolldice
+DICE = [
+    "1d20+5",
+    "4d6K3",
+    "8d6+2d8+3",
+    "10d6!",
+    "3d6R",
+    "2d20k1",
+    "1000d6",
+    "200000d6K10",
+    "1d20^2",
+]
+ODDS = ["1d20+5", "4d6K3", "8d6+2d8+3", "10d6!", "3d6R"]
+# extra memory allowed before it counts, small cases are mostly noise
+MEMORY_SLACK = 64
+
+
+def author(user: int) -> interactions.User:
+    return interactions.User(
+        id=str(user), username=f"user{user}", discriminator="0001", avatar=None
+    )
+
+
+class Context:
+    # all modify_param ever looks at
+    def __init__(self, user: int):
+        self.author = author(user)
+
+
+def sheet(user: int) -> dict:
+    rng = random.Random(user)
+    return {
+        "name": f"user{user}",
+        "stats": {stat: rng.randint(-1, 8) for stat in misc.stats},
+        "weapons": {
+            "Longsword": {"hit": "1d20+5", "dmg": "1d8+3", "type": "Slashing"},
+            "Shortbow": {"hit": "1d20+4", "dmg": "1d6+2", "type": "Piercing"},
+        },
+        "custom": {"Wis Save": rng.randint(0, 6), "Sneak": "3d6"},
+        "features": {},
+        "initiative": f"1d20+{rng.randint(0, 4)}",
+    }
+
+
+def generate(filename: Path, users: int):
+    content = {str(user): sheet(user) for user in range(1, users + 1)}
+    filename.write_text(json.dumps(content), encoding="utf-8")
+
+
+async def measure(func, duration: float) -> dict:
+    async def call():
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+
+    # the first call fills caches and pools, it isn't what is being measured
+    await call()
+    tracemalloc.start()
+    await call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fastest = 0.0
+    for _ in range(ROUNDS):
+        runs, started = 0, time.perf_counter()
+        while runs < 5 or time.perf_counter() - started < duration / ROUNDS:
+            await call()
+            runs += 1
+        fastest = max(fastest, runs / (time.perf_counter() - started))
+    return {"ops": round(fastest, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def sheet_cases(users: int, directory: Path) -> list:
+    filename = directory / f"stats-{users}.json"
+    generate(filename, users)
+
+    def load():
+        backend = sheets.open_backend(
+            "json", str(filename), constants.CONFIG.compact_after
+        )
+        constants.SHEETS = sheets.CharacterSheets(
+            backend, constants.CONFIG.flush_interval
+        )
+
+    load()
+    rng = random.Random(users)
+    skills = " ".join(str(n) for n in range(18))
+
+    def open_stats():
+        return misc.open_stats(author(rng.randint(1, users)))
+
+    def modify_param():
+        ctx = Context(rng.randint(1, users))
+        return json_lib.modify_param(ctx, "custom", "Wis Save", "1d20+4")
+
+    def write_stats():
+        return json_lib.write_stats(author(rng.randint(1, users)), skills)
+
+    def flush():
+        for _ in range(10):
+            constants.SHEETS.mark_dirty(rng.randint(1, users))
+        return constants.SHEETS.flush()
+
+    return [
+        (f"sheets load[{users}]", load),
+        (f"open_stats[{users}]", open_stats),
+        (f"modify_param[{users}]", modify_param),
+        (f"write_stats[{users}]", write_stats),
+        (f"flush[{users}]", flush),
+    ]
+
+
+def spell_cases() -> list:
+    cases = []
+    for fixture in sorted(FIXTURES.glob("*.html")):
+        page = fixture.read_text(encoding="utf-8")
+        _, parsed = wiki.parse_spell(page)
+        description = parsed["Description"]
+        cases += [
+            (
+                f"parse_spell[{fixture.stem}]",
+                lambda p=page: wiki.parse_spell(p),
+            ),
+            (
+                f"wrap_spell[{fixture.stem}]",
+                lambda d=description: misc.wrap_spell(d),
+            ),
+        ]
+    return cases
+
+
+def dice_cases() -> list:
+    cases = []
+    roller = author(1)
+    for expression in DICE:
+        cases += [
+            (
+                f"compile[{expression}]",
+                lambda e=expression: dice.compile.__wrapped__(e),
+            ),
+            (
+                f"evaluate[{expression}]",
+                lambda e=expression: dice.evaluate(e),
+            ),
+        ]
+    for expression in ODDS:
+        cases.append(
+            (
+                f"odds[{expression}]",
+                lambda e=expression: odds.distribution.__wrapped__(e),
+            )
+        )
+
+    rolled = dice.roll("4d6K3+2")
+    cases.append(
+        (
+            "unstable_roll_embed",
+            lambda: misc.unstable_roll_embed(roller, "4d6K3+2", rolled),
+        )
+    )
+    return cases
+
+
+def compare(name: str, result: dict, baselines: dict, tolerance: float):
+    baseline = baselines.get(name)
+    if baseline is None:
+        return "new", False
+    change = result["ops"] / baseline["ops"] - 1
+    slower = change < -tolerance
+    bigger = result["peak_kib"] > max(
+        baseline["peak_kib"] * (1 + tolerance),
+        baseline["peak_kib"] + MEMORY_SLACK,
+    )
+    note = f"{change:+.0%}"
+    if slower:
+        note += " SLOWER"
+    if bigger:
+        note += " BIGGER"
+    return note, slower or bigger
+
+
+async def run(args) -> int:
+    baselines = {}
+    if BASELINES.is_file():
+        baselines = json.loads(BASELINES.read_text(encoding="utf-8"))
+    elif not args.save:
+        print(f"No baselines in {BASELINES} yet, record them with --save")
+
+    results, regressed = {}, []
+    print(f"{'case':<32}{'ops/s':>12}{'us/op':>12}{'peak KiB':>12}  baseline")
+
+    async def run_cases(cases: list):
+        for name, func in cases:
+            if args.filter and args.filter not in name:
+                continue
+            result = await measure(func, args.duration)
+            results[name] = result
+            note, worse = compare(name, result, baselines, args.tolerance)
+            if worse:
+                regressed.append(name)
+            print(
+                f"{name:<32}{result['ops']:>12,.0f}"
+                f"{1e6 / result['ops']:>12,.1f}"
+                f"{result['peak_kib']:>12,.1f}  {note}"
+            )
+
+    await run_cases(spell_cases() + dice_cases())
+    with tempfile.TemporaryDirectory() as directory:
+        # one size at a time, so only one set of sheets is ever in memory
+        for users in args.sizes:
+            await run_cases(sheet_cases(users, Path(directory)))
+
+    await constants.WEB.close()
+    dice.ROLLERS.close()
+    constants.WORKERS.close()
+
+    if args.save:
+        BASELINES.parent.mkdir(exist_ok=True)
+        BASELINES.write_text(
+            json.dumps({**baselines, **results}, indent=4, sort_keys=True)
+            + "\n",
+            encoding="utf-8",
+        )
+        print(f"Saved {len(results)} baselines to {BASELINES}")
+    elif regressed:
+        print(f"{len(regressed)} cases regressed: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the hot paths against generated data."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda sizes: [int(size) for size in sizes.split(",")],
+        default=SIZES,
+        help="users in each generated stats.json, comma separated",
+    )
+    parser.add_argument(
+        "-k", "--filter", default="", help="only run cases containing this"
+    )
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="how much slower or bigger a case may get before it fails",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="store the results as baselines"
+    )
+    sys.exit(asyncio.run(run(parser.parse_args())))
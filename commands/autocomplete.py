@@ -1,6 +1,16 @@
 import interactions
 from interactions import CommandContext
-from lib import constants, misc
+from lib import constants, metrics, misc, simulate, spells
+
+
+# sheet keys come from the in-memory index, so no keystroke touches the disk
+def matching(keys: list[tuple[str, str]], value: str) -> list:
+    value = value.lower()
+    return [
+        interactions.Choice(name=key, value=key)
+        for lowered, key in keys
+        if value in lowered
+    ][:25]
 
 
 class AutoComplete(interactions.Extension):
@@ -9,93 +19,56 @@ class AutoComplete(interactions.Extension):
 
     @interactions.extension_autocomplete("attack", "weapon")
     @interactions.extension_autocomplete("modify", "weapon")
+    @metrics.timed
     async def weapon_autocomplete(self, ctx: CommandContext, value: str = ""):
-        content = await misc.open_stats(ctx.author)
-        try:
-            weapons: dict = content.get(str(ctx.author.id)).get("weapons")
-        except KeyError:
-            return
-
-        autocomplete = [
-            interactions.Choice(name=param, value=param)
-            for param in weapons.keys()
-            if value.lower() in param.lower()
-        ]
-        await ctx.populate(autocomplete)
+        weapons = constants.SHEETS.keys(ctx.author.id, "weapons")
+        await ctx.populate(matching(weapons, value))
 
     @interactions.extension_autocomplete("skill", "skill")
     @interactions.extension_autocomplete("modify", "skill")
+    @metrics.timed
     async def skill_autocomplete(self, ctx: CommandContext, value: str = ""):
-        content = await misc.open_stats(ctx.author)
-        try:
-            skills = content.get(str(ctx.author.id)).get("stats").keys()
-        except KeyError:
-            return
-
-        autocomplete = [
-            interactions.Choice(name=param, value=param)
-            for param in skills
-            if value.lower() in param.lower()
-        ]
-        await ctx.populate(autocomplete)
+        skills = constants.SHEETS.keys(ctx.author.id, "stats")
+        await ctx.populate(matching(skills, value))
 
     @interactions.extension_autocomplete("cast", "spell")
+    @metrics.timed
     async def cast_autocomplete(self, ctx: CommandContext, value: str = ""):
         autocomplete = [
             misc.create_choice(spellname, url)
-            for spellname, url in constants.SPELL_LIST
-            if value.lower() in spellname.lower()
-        ][:25]
+            for spellname, url in spells.SPELL_LIST.search(value)
+        ]
         await ctx.populate(autocomplete)
 
     @interactions.extension_autocomplete("custom", "custom")
     @interactions.extension_autocomplete("modify", "key")
+    @metrics.timed
     async def custom_autocomplete(self, ctx: CommandContext, value: str = ""):
-        content = await misc.open_stats(ctx.author)
-        try:
-            parameters = content.get(str(ctx.author.id)).get("custom")
-        except KeyError:
-            return
-        autocomplete = [
-            interactions.Choice(name=param, value=param)
-            for param in parameters.keys()
-            if value.lower() in param.lower()
-        ]
-        await ctx.populate(autocomplete)
+        parameters = constants.SHEETS.keys(ctx.author.id, "custom")
+        await ctx.populate(matching(parameters, value))
 
     @interactions.extension_autocomplete("modify", "char")
+    @metrics.timed
     async def char_autocomplete(self, ctx: CommandContext, value: str = ""):
-        content = await misc.open_stats(ctx.author)
-        try:
-            params = content.get(str(ctx.author.id))
-            # we don't want these to be modified
-            params.pop("weapons", None)
-            params.pop("stats", None)
-            params.pop("custom", None)
-            params.pop("spells", None)
-            params.pop("features", None)
-        except KeyError:
-            return
-
-        autocomplete = [
-            interactions.Choice(name=param, value=param)
-            for param in params.keys()
-            if value.lower() in param.lower()
+        # we don't want these to be modified
+        hidden = ("weapons", "stats", "custom", "spells", "features")
+        params = [
+            (lowered, param)
+            for lowered, param in constants.SHEETS.keys(ctx.author.id, "char")
+            if param not in hidden
         ]
-        await ctx.populate(autocomplete)
+        await ctx.populate(matching(params, value))
 
     @interactions.extension_autocomplete("dicestats", "dice")
+    @metrics.timed
     async def dicestats_autocomplete(
         self, ctx: CommandContext, value: str = ""
     ):
-        rolls = [
-            ("d4+d10+2  (Very UP - 0.25)", "d4+d10+2"),
-            ("3d6       (UP      - 0.32)", "3d6"),
-            ("3d6R      (Average - 0.52)", "3d6R"),
-            ("4d6X3     (Average - 0.58)", "4d6X3"),
-            ("2d8+4     (High OP - 0.96)", "2d8+4"),
-            ("3d6X2+6   (High OP - 1.00)", "3d6X2+6"),
-        ]
+        # hints show up once the simulations from start up have finished
+        rolls = []
+        for method in simulate.METHODS:
+            report = simulate.SIMULATOR.cached(method)
+            rolls.append((report.hint if report else method, method))
 
         autocomplete = [
             interactions.Choice(name=rollname, value=rollval)
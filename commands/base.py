@@ -6,7 +6,7 @@ import re
 import interactions
 import tabulate
 from interactions import CommandContext
-from lib import constants, misc
+from lib import constants, metrics, misc, sheets
 
 scope = constants.CONFIG.scope
 
@@ -19,6 +19,7 @@ class BaseCommands(interactions.Extension):
         name="ping",
         description="Get latency.",
     )
+    @metrics.timed
     async def ping(self, ctx: CommandContext):
         await ctx.send(
             embeds=misc.quick_embed(
@@ -31,6 +32,7 @@ class BaseCommands(interactions.Extension):
     @interactions.extension_command(
         name="kill", description="Kill bot.", scope=scope
     )
+    @metrics.timed
     async def kill(self, ctx: CommandContext):
         if int(ctx.author.id) == constants.CONFIG.owner.get("id", 0):
             await ctx.send(
@@ -39,6 +41,7 @@ class BaseCommands(interactions.Extension):
                 ),
                 ephemeral=True,
             )
+            await constants.SHEETS.flush()
             raise KeyboardInterrupt
         else:
             return await ctx.send(
@@ -60,6 +63,7 @@ class BaseCommands(interactions.Extension):
             )
         ],
     )
+    @metrics.timed
     async def sort(self, ctx: CommandContext, entities: str):
         entities = re.findall(constants.ENTITIES_SYNTAX, entities)
         entities: list = [entity.split(":") for entity in entities]
@@ -76,7 +80,8 @@ class BaseCommands(interactions.Extension):
         entities.sort(key=operator.itemgetter(1), reverse=True)
 
         pretty_print = [[name, initiative] for name, initiative in entities]
-        pretty_print = tabulate.tabulate(
+        pretty_print = await constants.WORKERS.process(
+            tabulate.tabulate,
             [["Name", "Initiative"], *pretty_print],
             tablefmt="orgtbl",
             headers="firstrow",
@@ -98,6 +103,7 @@ class BaseCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def retrieve(self, ctx: CommandContext, ephemeral: bool = False):
         try:
             retrieved = await misc.open_stats(ctx.author)
@@ -154,6 +160,7 @@ class BaseCommands(interactions.Extension):
             )
         ],
     )
+    @metrics.timed
     async def backup(self, ctx: CommandContext, ephemeral: bool = False):
         try:
             owner = constants.CONFIG.owner_id
@@ -176,7 +183,12 @@ class BaseCommands(interactions.Extension):
                 ephemeral=True,
             )
 
-        file = constants.SHEETS.read()
+        # every sheet pretty printed is slow, so it is done in another process
+        # from the sheets as last saved, which the loop can't change under it
+        await constants.SHEETS.flush()
+        file = await constants.WORKERS.process(
+            sheets.pretty, constants.SHEETS.serialized()
+        )
         file = io.StringIO(file)
         files = interactions.File(filename="sheets.json", fp=file)
         await ctx.send(files=files, ephemeral=ephemeral)
@@ -1,9 +1,8 @@
 import string
 
 import interactions
-import rolldice
 from interactions import CommandContext
-from lib import json_lib, misc
+from lib import dice, json_lib, metrics, misc
 from lib.misc import user_check
 
 
@@ -65,6 +64,7 @@ class ModifyAttributes(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def modify_weapon(
         self,
         ctx: CommandContext,
@@ -78,12 +78,9 @@ class ModifyAttributes(interactions.Extension):
 
         try:
             if hit.lower() != "none":
-                _, _ = rolldice.roll_dice(hit)
-            _, _ = rolldice.roll_dice(dmg)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
+                await dice.validate(hit)
+            await dice.validate(dmg)
+        except dice.DiceError as exc:
             return await ctx.send(
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
@@ -118,6 +115,7 @@ class ModifyAttributes(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def modify_char(self, ctx: CommandContext, char: str, value: str):
         if await user_check(ctx):
             return
@@ -148,16 +146,14 @@ class ModifyAttributes(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def modify_custom(self, ctx: CommandContext, key: str, value: str):
         if await user_check(ctx):
             return
         value = value.replace("k", "").replace("K", "")
         try:
-            _, _ = rolldice.roll_dice(value)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
+            await dice.validate(value)
+        except dice.DiceError as exc:
             return await ctx.send(
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
@@ -189,6 +185,7 @@ class ModifyAttributes(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def modify_skill(self, ctx: CommandContext, skill: str, value: int):
         if await user_check(ctx):
             return
@@ -219,6 +216,7 @@ class ModifyAttributes(interactions.Extension):
             )
         ],
     )
+    @metrics.timed
     async def save_skills(
         self, ctx: interactions.CommandContext, attributes: str
     ):
@@ -1,12 +1,11 @@
 import asyncio
 import string
 
+import aiohttp
 import interactions
-import requests
-import rolldice
-from bs4 import BeautifulSoup, SoupStrainer
 from interactions import CommandContext
-from lib import json_lib, misc, constants
+from lib import constants, metrics, misc, spells
+from lib import dice as engine
 
 
 class RollCommands(interactions.Extension):
@@ -59,6 +58,7 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def roll(
         self,
         ctx,
@@ -70,13 +70,15 @@ class RollCommands(interactions.Extension):
         ephemeral: bool = False,
     ):
         if rolls <= 0:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embed=misc.quick_embed(
                     "Error", "Rolls can't be negative or zero!", "error"
                 )
             )
         if sides < 1:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embed=misc.quick_embed(
                     "Error", "A dice can't have less than 1 sides", "error"
                 )
@@ -104,19 +106,17 @@ class RollCommands(interactions.Extension):
             display_syn += opr + extension
 
         try:
-            result, explanation = rolldice.roll_dice(dice_expr)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
-            return await ctx.send(
+            rolled = await engine.evaluate(dice_expr)
+        except engine.DiceError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
         embed = misc.unstable_roll_embed(
-            ctx.author, display_syn, result, explanation, implication
+            ctx.author, display_syn, rolled, implication
         )
-        await ctx.send(embeds=embed, ephemeral=ephemeral)
+        await constants.OUTBOUND.send(ctx, embeds=embed, ephemeral=ephemeral)
 
     @interactions.extension_command(
         name="custom",
@@ -141,6 +141,7 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def custom(
         self, ctx: CommandContext, custom: str, implication: str = ""
     ):
@@ -154,30 +155,27 @@ class RollCommands(interactions.Extension):
                 .get(custom)
             )
         except KeyError:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed(
                     "Error", "No such parameter available!", "error"
                 ),
                 ephemeral=True,
             )
         display_param = parameter
-        parameter = "".join(parameter.split())
-        parameter = misc.normalize_implication(parameter, implication)
         try:
-            result, explanation = rolldice.roll_dice(parameter)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
-            return await ctx.send(
+            rolled = await engine.evaluate(parameter, implication)
+        except engine.DiceError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
 
         embed = misc.unstable_roll_embed(
-            ctx.author, display_param, result, explanation, implication
+            ctx.author, display_param, rolled, implication
         )
-        await ctx.send(embeds=embed)
+        await constants.OUTBOUND.send(ctx, embeds=embed)
 
     @interactions.extension_command(
         name="cast",
@@ -192,43 +190,39 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def cast(self, ctx: CommandContext, spell: str):
         if await misc.user_check(ctx):
             return
 
-        spell_url = spell.lower().replace(" ", "-").replace("'", "")
-        spell_url = "http://dnd5e.wikidot.com/spell:" + spell_url
-        page = requests.get(spell_url, timeout=60)
-        status_code: int = page.status_code
-        if status_code != 200:
-            return await ctx.send(
+        try:
+            spellname, spell_attrs = await spells.CACHE.get(spell)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            spell_url = spells.SPELL_URL + spells.slugify(spell)
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed(
                     f"Failed to fetch spell: {spell_url}",
+                    f"The wiki did not respond, please try again later. ({type(exc).__name__})",
+                    "error",
+                ),
+                ephemeral=True,
+            )
+        except spells.SpellFetchError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
+                embeds=misc.quick_embed(
+                    f"Failed to fetch spell: {exc.url}",
                     "Please check if spell exists and try again. Status Code: "
-                    + str(status_code),
+                    + str(exc.status_code),
                     "error",
                 ),
                 ephemeral=True,
             )
-        soup = BeautifulSoup(
-            page.text,
-            "html.parser",
-            parse_only=SoupStrainer("div", "main-content"),
-        )
-        spellname, spell_attrs = json_lib.spell_to_dict(soup.get_text())
-
-        embed = misc.spell_embed(ctx, spellname, spell_attrs)
 
-        dice = spell_attrs.get("Description")
-        dice: str = dice + spell_attrs.get("At Higher Levels")
-        found_dice = list(
-            map(
-                lambda x: x.replace(" ", ""),
-                constants.SPELL_DICE_SYNTAX.findall(dice),
-            )
-        )
-        dice_syns = [*dict.fromkeys(found_dice)]
-        buttons = [misc.to_button(dice) for dice in dice_syns]
+        template = misc.spell_template(spellname, spell_attrs)
+        embed = template.embeds(ctx.author)
+        buttons = template.buttons()
 
         link_button = interactions.Button(
             style=interactions.ButtonStyle.LINK,
@@ -244,9 +238,11 @@ class RollCommands(interactions.Extension):
             buttons.append(link_button)
             buttons.append(cancel_button)
             rows = interactions.spread_to_rows(*buttons)
-            await ctx.send(embeds=embed, components=rows)
+            await constants.OUTBOUND.send(ctx, embeds=embed, components=rows)
         else:
-            return await ctx.send(embeds=embed, components=link_button)
+            return await constants.OUTBOUND.send(
+                ctx, embeds=embed, components=link_button
+            )
 
         async def check(button_ctx: interactions.ComponentContext):
             if int(button_ctx.author.id) == int(ctx.author.id):
@@ -260,7 +256,9 @@ class RollCommands(interactions.Extension):
                 name=misc.author_name(button_ctx.author),
                 icon_url=misc.author_url(button_ctx.author),
             )
-            await button_ctx.send(embeds=error_embed, ephemeral=True)
+            await constants.OUTBOUND.send(
+                button_ctx, embeds=error_embed, ephemeral=True
+            )
             return False
 
         def disable(buttons: list[interactions.Button]):
@@ -277,50 +275,53 @@ class RollCommands(interactions.Extension):
             performed = button_ctx.data.custom_id
             if performed == "cancel":
                 disable(buttons)
-                await button_ctx.send(
+                await constants.OUTBOUND.send(
+                    button_ctx,
                     embeds=misc.quick_embed(
                         "Cancelled Roll", "No rolls selected.", "ok"
                     ),
                     ephemeral=True,
                 )
-                return await ctx.edit(
-                    components=interactions.spread_to_rows(*buttons)
+                return constants.OUTBOUND.edit(
+                    ctx, components=interactions.spread_to_rows(*buttons)
                 )
 
             disable(buttons)
-            await ctx.edit(components=interactions.spread_to_rows(*buttons))
+            constants.OUTBOUND.edit(
+                ctx, components=interactions.spread_to_rows(*buttons)
+            )
             try:
-                result, explanation = rolldice.roll_dice(performed)
-            except (
-                rolldice.DiceGroupException,
-                rolldice.DiceOperatorException,
-            ) as exc:
-                return await ctx.send(
+                rolled = await engine.evaluate(performed)
+            except engine.DiceError as exc:
+                return await constants.OUTBOUND.send(
+                    ctx,
                     embeds=misc.quick_embed("Error", str(exc), "error"),
                     ephemeral=True,
                 )
             roll_embed = misc.unstable_roll_embed(
-                ctx.author, performed, result, explanation, ""
+                ctx.author, performed, rolled, ""
             )
 
-            return await button_ctx.send(embeds=roll_embed)
+            return await constants.OUTBOUND.send(button_ctx, embeds=roll_embed)
         except asyncio.TimeoutError:
             disable(buttons)
-            return await ctx.edit(
-                components=interactions.spread_to_rows(*buttons)
+            return constants.OUTBOUND.edit(
+                ctx, components=interactions.spread_to_rows(*buttons)
             )
 
     @interactions.extension_command(
         name="initiative",
         description="Roll for initiative.",
     )
+    @metrics.timed
     async def initiative(self, ctx: interactions.CommandContext):
         if await misc.user_check(ctx):
             return
         content = await misc.open_stats(ctx.author)
         init = content.get(str(ctx.author.id)).get("initiative")
         if not init:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed(
                     "Error", "Initiative has not been set.", "error"
                 ),
@@ -328,27 +329,25 @@ class RollCommands(interactions.Extension):
             )
 
         try:
-            result, explanation = rolldice.roll_dice(init)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
-            return await ctx.send(
+            rolled = await engine.evaluate(init)
+        except engine.DiceError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
 
-        embed = misc.unstable_roll_embed(ctx.author, init, result, explanation)
+        embed = misc.unstable_roll_embed(ctx.author, init, rolled)
 
         syntax_embed = misc.quick_embed(
             "Initiative Syntax",
-            f"```{misc.author_name(ctx.author)}:{result} ```",
+            f"```{misc.author_name(ctx.author)}:{rolled.total} ```",
             "ok",
         )
         syntax_embed.set_footer(
             "Copy this ⬆️ (including the space at the end) for the `/sort` command! "
         )
-        await ctx.send(embeds=[embed, syntax_embed])
+        await constants.OUTBOUND.send(ctx, embeds=[embed, syntax_embed])
 
     @interactions.extension_command(
         name="skill",
@@ -373,6 +372,7 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def skill(
         self,
         ctx: interactions.CommandContext,
@@ -390,7 +390,8 @@ class RollCommands(interactions.Extension):
                 .get(string.capwords(skill))
             )
         except KeyError:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed(
                     "Error",
                     f"No such skill available! ({string.capwords(skill)})",
@@ -406,12 +407,10 @@ class RollCommands(interactions.Extension):
             dice_syn += str(skill) if int(skill) < 0 else f"+{skill}"
 
         try:
-            result, explanation = rolldice.roll_dice(dice_syn)
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
-            return await ctx.send(
+            rolled = await engine.evaluate(dice_syn)
+        except engine.DiceError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
@@ -424,11 +423,10 @@ class RollCommands(interactions.Extension):
         embed = misc.unstable_roll_embed(
             ctx.author,
             title,
-            result,
-            explanation,
+            rolled,
             implication,
         )
-        await ctx.send(embeds=embed)
+        await constants.OUTBOUND.send(ctx, embeds=embed)
 
     @interactions.extension_command(
         name="attack",
@@ -453,6 +451,7 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def attack(
         self,
         ctx: interactions.CommandContext,
@@ -467,7 +466,8 @@ class RollCommands(interactions.Extension):
             weapon_str = weapon
             weapon = weapons.get(weapon)
         except KeyError:
-            return await ctx.send(
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed(
                     "Error", "No such weapon available!", "error"
                 ),
@@ -492,7 +492,9 @@ class RollCommands(interactions.Extension):
 
         buttons = [misc.to_button(name, dice) for name, dice in attacks]
 
-        await ctx.send(embeds=initial_embed, components=buttons)
+        await constants.OUTBOUND.send(
+            ctx, embeds=initial_embed, components=buttons
+        )
 
         async def auth_check(button_ctx: interactions.ComponentContext):
             if int(button_ctx.author.id) == int(ctx.author.id):
@@ -507,7 +509,9 @@ class RollCommands(interactions.Extension):
                 name=misc.author_name(button_ctx.author),
                 icon_url=misc.author_url(button_ctx.author),
             )
-            await button_ctx.send(embeds=error_embed, ephemeral=True)
+            await constants.OUTBOUND.send(
+                button_ctx, embeds=error_embed, ephemeral=True
+            )
             return False
 
         try:
@@ -518,29 +522,26 @@ class RollCommands(interactions.Extension):
             )
             selected = button_ctx.data.custom_id
 
-            dice_syn = misc.normalize_implication(selected, implication)
-
             try:
-                result, explanation = rolldice.roll_dice(dice_syn)
-            except (
-                rolldice.DiceGroupException,
-                rolldice.DiceOperatorException,
-            ) as exc:
-                return await ctx.send(
+                plan = engine.compile(selected, implication)
+                rolled = await plan.evaluate()
+            except engine.DiceError as exc:
+                return await constants.OUTBOUND.send(
+                    ctx,
                     embeds=misc.quick_embed("Error", str(exc), "error"),
                     ephemeral=True,
                 )
             roll_embed = misc.unstable_roll_embed(
-                ctx.author, dice_syn, result, explanation, ""
+                ctx.author, plan.expression, rolled, ""
             )
             for button in buttons:
                 button.disabled = True
-            await ctx.edit(components=buttons)
-            await button_ctx.send(embeds=roll_embed)
+            constants.OUTBOUND.edit(ctx, components=buttons)
+            await constants.OUTBOUND.send(button_ctx, embeds=roll_embed)
         except asyncio.TimeoutError:
             for button in buttons:
                 button.disabled = True
-            return await ctx.edit(components=buttons)
+            return constants.OUTBOUND.edit(ctx, components=buttons)
 
     @interactions.extension_command(
         name="dicestats",
@@ -561,23 +562,22 @@ class RollCommands(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def roll_stats(
         self, ctx: CommandContext, dice: str, ephemeral: bool = False
     ):
         try:
-            stats = [rolldice.roll_dice(dice) for _ in range(6)]
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
-            return await ctx.send(
+            stats = [await engine.evaluate(dice) for _ in range(6)]
+        except engine.DiceError as exc:
+            return await constants.OUTBOUND.send(
+                ctx,
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
 
         embed = misc.stats_embed(ctx.author, stats, dice)
 
-        await ctx.send(embeds=embed, ephemeral=ephemeral)
+        await constants.OUTBOUND.send(ctx, embeds=embed, ephemeral=ephemeral)
 
 
 def setup(client):
@@ -1,8 +1,9 @@
+import asyncio
+import io
+
 import interactions
-import pyfiglet
-import rolldice
 from interactions import CommandContext
-from lib import constants, misc
+from lib import constants, dice, metrics, misc, odds
 
 scope = constants.CONFIG.scope
 
@@ -35,6 +36,7 @@ class Unstable(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def unstable_eval(
         self,
         ctx: interactions.CommandContext,
@@ -42,24 +44,19 @@ class Unstable(interactions.Extension):
         ephemeral: bool = False,
     ):
         try:
-            result, explanation = rolldice.roll_dice(expr)
-            explanation = explanation.replace(",", ", ")
-        except (
-            rolldice.DiceGroupException,
-            rolldice.DiceOperatorException,
-        ) as exc:
+            rolled = await dice.evaluate(expr)
+        except dice.DiceError as exc:
             return await ctx.send(
                 embeds=misc.quick_embed("Error", str(exc), "error"),
                 ephemeral=True,
             )
 
-        figlet = pyfiglet.figlet_format(str(result), "fraktur", width=60)
-        figlet = figlet.replace("`", "\u200B`")
-        desc = f"```{figlet}```" if len(figlet) < 1024 else f"**{result}**"
+        result = rolled.total
+        desc = misc.banner(str(result))
         title, status = f"Evaluation: {expr}", "ok"
         embed = misc.quick_embed(title, desc, status)
 
-        embed.set_footer(f"{explanation} = {result}")
+        embed.set_footer(f"{rolled.explanation} = {result}")
         await ctx.send(embeds=embed, ephemeral=ephemeral)
 
     @unstable.subcommand(
@@ -72,6 +69,12 @@ class Unstable(interactions.Extension):
                 type=interactions.OptionType.INTEGER,
                 required=True,
             ),
+            interactions.Option(
+                name="expr",
+                description="Dice expression to roll. Defaults to `1d20`",
+                type=interactions.OptionType.STRING,
+                required=False,
+            ),
             interactions.Option(
                 name="bonus",
                 description="bonuses on the number",
@@ -97,35 +100,64 @@ class Unstable(interactions.Extension):
             ),
         ],
     )
+    @metrics.timed
     async def unstable_chance(
         self,
         ctx: CommandContext,
         target: int,
+        expr: str = "1d20",
         bonus: int = 0,
         implication: str = "",
         ephemeral: bool = True,
     ):
+        rolled = expr
+        if bonus:
+            rolled += str(bonus) if bonus < 0 else f"+{bonus}"
+        try:
+            # exact odds can take a good fraction of a second to work out,
+            # and the workers are shared, so nobody waits longer than a roll
+            chance = await asyncio.wait_for(
+                constants.WORKERS.process(odds.at_least, rolled, target),
+                constants.CONFIG.dice_timeout,
+            )
+        except asyncio.TimeoutError:
+            return await ctx.send(
+                embeds=misc.quick_embed(
+                    "Error", str(odds.TooComplex(rolled)), "error"
+                ),
+                ephemeral=True,
+            )
+        except dice.DiceError as exc:
+            return await ctx.send(
+                embeds=misc.quick_embed("Error", str(exc), "error"),
+                ephemeral=True,
+            )
+
+        # the whole roll is made two (or three) times and the best or worst
+        # one is taken, which for a d20 is the usual advantage
         match implication:
             case "":
-                chance_decimal = ((21 + bonus - target) / 20) * 100
                 embed_image = "https://imgur.com/0waYikK.png"
             case "adv":
-                chance_decimal = (1 - (((target - bonus - 1) ** 2) / 400)) * 100
+                chance = 1 - (1 - chance) ** 2
                 embed_image = "https://imgur.com/n3zqzJI.png"
                 implication = "*Advantage*"
             case "dis":
-                chance_decimal = ((21 + bonus - target) ** 2 / 400) * 100
+                chance = chance**2
                 embed_image = "https://imgur.com/L5M3KnW.png"
                 implication = "*Disadvantage*"
             case "ea":
-                chance_decimal = (1 - ((target - bonus - 1) ** 3) / 8000) * 100
+                chance = 1 - (1 - chance) ** 3
                 embed_image = "https://imgur.com/O6DbU4w.png"
                 implication = "*Elven Accuracy*"
             case _:
-                chance_decimal = 0
+                chance = 0
                 embed_image = ""
 
-        chance_decimal = max(chance_decimal, 0.0)
+        # the charts only describe a plain d20
+        if expr != "1d20":
+            embed_image = ""
+        chance_decimal = chance * 100
 
         if chance_decimal > 66:
             likelihood = "Likely to hit or exceed."
@@ -136,7 +168,7 @@ class Unstable(interactions.Extension):
 
         chance_decimal = str(round(chance_decimal, 2)) + "%"
         embed = interactions.Embed(
-            title=f"Probability to exceed {target}",
+            title=f"Probability for {expr} to exceed {target}",
             description="**" + chance_decimal + "**",
             color=0xE2E0DD,
             image=interactions.EmbedImageStruct(url=embed_image),
@@ -148,6 +180,30 @@ class Unstable(interactions.Extension):
         embed.set_footer(likelihood)
         await ctx.send(embeds=embed, ephemeral=ephemeral)
 
+    @unstable.subcommand(
+        name="metrics",
+        description="Command latencies, errors and cache hit ratios.",
+    )
+    async def unstable_metrics(self, ctx: CommandContext):
+        if int(ctx.author.id) != constants.CONFIG.owner_id:
+            return await ctx.send(
+                embeds=misc.quick_embed(
+                    "Insufficient privileges.", "Not Owner.", "error"
+                ),
+                ephemeral=True,
+            )
+
+        summary = metrics.METRICS.summary() or "Nothing recorded yet."
+        if len(summary) > 4000:
+            files = interactions.File(
+                filename="metrics.txt", fp=io.StringIO(summary)
+            )
+            return await ctx.send(files=files, ephemeral=True)
+        await ctx.send(
+            embeds=misc.quick_embed("Metrics", f"```{summary}```", "ok"),
+            ephemeral=True,
+        )
+
 
 def setup(client):
     Unstable(client)
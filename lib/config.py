@@ -19,6 +19,12 @@ class Config:
         self.log_file: str = self.__config.get("log", "").get("file", "")
         self.log_level: str = self.__config.get("log", "").get("level", "WARN")
         self.barred: dict = self.__config.get("barred", "")
+        self.sheets: dict = self.__config.get("sheets", {})
+        self.http: dict = self.__config.get("http", {})
+        self.spells: dict = self.__config.get("spells", {})
+        self.dice: dict = self.__config.get("dice", {})
+        self.workers: dict = self.__config.get("workers", {})
+        self.metrics: dict = self.__config.get("metrics", {})
 
     @property
     def scope(self) -> list:
@@ -32,6 +38,86 @@ class Config:
     def barred_users(self) -> list:
         return self.barred.get("users", [])
 
+    @property
+    def flush_interval(self) -> float:
+        return float(self.sheets.get("flush_interval", 5))
+
+    @property
+    def sheets_backend(self) -> str:
+        return self.sheets.get("backend", "json")
+
+    @property
+    def sheets_path(self) -> str:
+        return self.sheets.get("path", "")
+
+    @property
+    def compact_after(self) -> int:
+        return int(self.sheets.get("compact_after", 500))
+
+    @property
+    def http_timeout(self) -> float:
+        return float(self.http.get("timeout", 20))
+
+    @property
+    def http_concurrency(self) -> int:
+        return int(self.http.get("concurrency", 4))
+
+    @property
+    def spell_cache_dir(self) -> str:
+        return self.spells.get("cache_dir", "spell_cache")
+
+    @property
+    def spell_cache_ttl(self) -> float:
+        return float(self.spells.get("cache_days", 30)) * 24 * 60 * 60
+
+    @property
+    def spell_cache_size(self) -> int:
+        return int(self.spells.get("cache_size", 128))
+
+    @property
+    def spell_compendium(self) -> str:
+        return self.spells.get("compendium", "compendium.json")
+
+    @property
+    def spell_list(self) -> str:
+        return self.spells.get("list", "spell_list.json")
+
+    @property
+    def dice_shown(self) -> int:
+        return int(self.dice.get("shown", 100))
+
+    @property
+    def simulation_trials(self) -> int:
+        return int(self.dice.get("trials", 100_000))
+
+    @property
+    def dice_budget(self) -> float:
+        return float(self.dice.get("budget", 5_000_000))
+
+    @property
+    def dice_inline(self) -> float:
+        return float(self.dice.get("inline", 10_000))
+
+    @property
+    def dice_timeout(self) -> float:
+        return float(self.dice.get("timeout", 5))
+
+    @property
+    def worker_threads(self) -> int:
+        return int(self.workers.get("threads", 0))
+
+    @property
+    def worker_processes(self) -> int:
+        return int(self.workers.get("processes", 0))
+
+    @property
+    def metrics_host(self) -> str:
+        return self.metrics.get("host", "127.0.0.1")
+
+    @property
+    def metrics_port(self) -> int:
+        return int(self.metrics.get("port", 9184))
+
     def set_logs(self):
         match self.log_level:
             case "DEBUG":
@@ -54,3 +140,7 @@ class Config:
             logging.basicConfig(**args, filename=filename)
         else:
             logging.basicConfig(**args)
+
+
+# read once, by the bot and by every worker process that needs it
+CONFIG = Config()
@@ -0,0 +1,506 @@
+import asyncio
+import functools
+import heapq
+import operator
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import rolldice
+
+from lib import config, metrics, workers
+
+OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+# rolldice splits expressions on every one of these
+SEPARATORS = re.compile(r"([()/=<>,%^+*-])")
+LITERAL = re.compile(r"\d+")
+INITIAL_DICE_SYNTAX = re.compile(r"(\d*d\d+)")
+# a dice group with at most one modifier, anything the engine does not
+# understand (penetrating dice, success counting, ...) is left to rolldice
+GROUP = re.compile(
+    r"(?P<count>\d*)d(?P<sides>\d+)"
+    r"(?:(?P<keep>[KkXx])(?P<kept>\d*)"
+    r"|(?P<reroll>[Rr])(?P<rerolled>\d*)"
+    r"|(?P<explode>!)(?P<exploding>\d*)"
+    r"|(?P<each>[asm])(?P<amount>\d+))?"
+)
+# the dice groups rolldice rolls more of, with what makes a die roll again
+FALLBACK_GROUP = re.compile(
+    r"(?P<count>\d*)d(?P<sides>\d+)"
+    r"(?:(?P<again>!p?|R|r)(?P<compare>[<>]?)(?P<target>\d*))?",
+    re.IGNORECASE,
+)
+OPERATOR_ERROR = "Error parsing operators and or functions"
+# rolldice hands expressions to python, which refuses more than 200 nested
+# brackets and gives up a little under 500 operators deep; everything here
+# recurses as deep as the expression goes, so it has to give up first
+MAX_NESTING = 200
+MAX_DEPTH = 400
+# pools with more dice than this are summarised instead of listed
+MAX_SHOWN = config.CONFIG.dice_shown
+# rough number of dice rolled, see Expression.cost
+BUDGET = config.CONFIG.dice_budget
+INLINE_COST = config.CONFIG.dice_inline
+
+
+class DiceError(Exception):
+    pass
+
+
+class DiceGroupError(DiceError):
+    pass
+
+
+class DiceOperatorError(DiceError):
+    pass
+
+
+# messages are built when shown, so these survive the trip back from a
+# worker process with the expression intact
+class DiceBudgetError(DiceError):
+    def __str__(self) -> str:
+        return f"{self.args[0]} has too many dice to roll."
+
+
+class DiceTimeoutError(DiceError):
+    def __str__(self) -> str:
+        return f"{self.args[0]} took too long to roll."
+
+
+class Unsupported(Exception):
+    pass
+
+
+def invalid_group(group: str) -> DiceGroupError:
+    return DiceGroupError(f'"{group}" is not a valid dicegroup.')
+
+
+def _join(rolls: list, separator: str = ", ") -> str:
+    return separator.join(str(roll) for roll in rolls)
+
+
+class Result:
+    # the dice themselves are left behind, a pool near the budget would
+    # take longer to send back from a worker than to roll
+    def __init__(self, total: int | float, explanation: str):
+        self.total = total
+        # ready to display, e.g. "[15 ~~ 5] + 3"
+        self.explanation = explanation
+
+
+class Number:
+    def __init__(self, text: str):
+        self.text = text
+        self.value = int(text)
+        self.depth = 1
+
+    def cost(self) -> float:
+        return 1
+
+    def evaluate(self) -> tuple[int, str]:
+        return self.value, self.text
+
+
+class Dice:
+    def __init__(self, group: str):
+        match = GROUP.fullmatch(group)
+        if match is None:
+            raise Unsupported(group)
+
+        self.group = group
+        self.depth = 1
+        self.count = int(match["count"] or 1)
+        self.sides = int(match["sides"])
+        self.faces = range(1, self.sides + 1)
+        self.keep = match["keep"]
+        self.kept = int(match["kept"] or 1)
+        self.reroll = match["reroll"]
+        self.rerolled = int(match["rerolled"] or 1)
+        self.explode = match["explode"]
+        self.exploding = int(match["exploding"] or self.sides)
+        self.each = match["each"]
+        self.amount = int(match["amount"] or 0)
+
+        # same bounds rolldice enforces, checked once instead of every roll
+        if self.count < 1 or self.sides < 1:
+            raise invalid_group(group)
+        if self.keep and not 1 <= self.kept < self.count:
+            raise invalid_group(group)
+        if self.reroll and not 0 < self.rerolled <= self.sides:
+            raise invalid_group(group)
+        if self.explode and not 0 < self.exploding <= self.sides:
+            raise invalid_group(group)
+        # a single sided die would reroll or explode forever
+        if (self.reroll == "R" or self.explode) and self.sides == 1:
+            raise invalid_group(group)
+
+    def cost(self) -> float:
+        # rerolling and exploding dice roll this many dice on average
+        if self.reroll == "R" or self.explode:
+            return self.count * self.sides / (self.sides - 1)
+        if self.reroll == "r":
+            return self.count * (1 + 1 / self.sides)
+        return self.count
+
+    def roll(self, count: int) -> list[int]:
+        # one batched draw instead of a randint call per die
+        return random.choices(self.faces, k=count)
+
+    def keep_total(self, rolled: list[int], total: int) -> int:
+        # only the smaller side of the split is ever selected
+        pick = heapq.nlargest if self.keep in "KX" else heapq.nsmallest
+        drop = heapq.nsmallest if self.keep in "KX" else heapq.nlargest
+        if self.kept <= len(rolled) - self.kept:
+            return sum(pick(self.kept, rolled))
+        return total - sum(drop(len(rolled) - self.kept, rolled))
+
+    def summary(self, rolled: list[int], total: int) -> str:
+        # huge pools would not fit in an embed field, let alone be readable
+        shown = f"{len(rolled)} dice, {min(rolled)} to {max(rolled)}"
+        if self.keep:
+            side = "highest" if self.keep in "KX" else "lowest"
+            shown += f", {side} {self.kept}"
+        return f"[{shown} = {total}]"
+
+    def evaluate(self) -> tuple[int, str]:
+        rolled = self.roll(self.count)
+        summarised = len(rolled) > MAX_SHOWN
+
+        if self.keep:
+            if summarised:
+                total = self.keep_total(rolled, sum(rolled))
+                return total, self.summary(rolled, total)
+            rolled.sort(reverse=self.keep in "KX")
+            chosen, rest = rolled[: self.kept], rolled[self.kept :]
+            if self.keep in "Kk":
+                shown = f"{_join(chosen)} ~~ {_join(rest)}"
+            else:
+                shown = f"{_join(rest)} ~~ {_join(chosen)}"
+            return sum(chosen), f"[{shown}]"
+
+        if self.reroll:
+            history = [[value] for value in rolled]
+            pending = [
+                i for i, value in enumerate(rolled) if value == self.rerolled
+            ]
+            while pending:
+                for i, value in zip(pending, self.roll(len(pending))):
+                    rolled[i] = value
+                    history[i].append(value)
+                if self.reroll == "r":
+                    break
+                pending = [i for i in pending if rolled[i] == self.rerolled]
+            if summarised:
+                return sum(rolled), self.summary(rolled, sum(rolled))
+            shown = [_join(reversed(values), "~") for values in history]
+            return sum(rolled), f"[{', '.join(shown)}]"
+
+        if self.explode:
+            exploded = rolled.count(self.exploding)
+            while exploded:
+                extra = self.roll(exploded)
+                rolled.extend(extra)
+                exploded = extra.count(self.exploding)
+            if len(rolled) > MAX_SHOWN:
+                return sum(rolled), self.summary(rolled, sum(rolled))
+            shown = [
+                f"!{value}" if value == self.exploding else str(value)
+                for value in rolled
+            ]
+            return sum(rolled), f"[{', '.join(shown)}]"
+
+        if self.each:
+            match self.each:
+                case "a":
+                    total, sign = sum(rolled) + self.amount * self.count, "+"
+                case "s":
+                    total, sign = sum(rolled) - self.amount * self.count, "s"
+                case _:
+                    total, sign = sum(rolled) * self.amount, "m"
+            if summarised:
+                return total, self.summary(rolled, total)
+            modified = [f"{value}{sign}{self.amount}" for value in rolled]
+            return total, f"[{', '.join(modified)}]"
+
+        if summarised:
+            return sum(rolled), self.summary(rolled, sum(rolled))
+        return sum(rolled), f"[{_join(rolled)}]"
+
+
+class Unary:
+    def __init__(self, op: str, operand):
+        self.op = op
+        self.operand = operand
+        self.depth = operand.depth + 1
+
+    def cost(self) -> float:
+        return self.operand.cost() + 1
+
+    def evaluate(self) -> tuple[int | float, str]:
+        value, shown = self.operand.evaluate()
+        # rolldice only keeps the sign against numbers and brackets
+        if not isinstance(self.operand, (Number, Parens)):
+            shown = f" {shown}"
+        return (-value if self.op == "-" else value), f"{self.op}{shown}"
+
+
+class Binary:
+    def __init__(self, op: str, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.depth = max(left.depth, right.depth) + 1
+
+    def cost(self) -> float:
+        return self.left.cost() + self.right.cost() + 1
+
+    def evaluate(self) -> tuple[int | float, str]:
+        left, left_shown = self.left.evaluate()
+        right, right_shown = self.right.evaluate()
+        try:
+            value = OPERATORS[self.op](left, right)
+        except ZeroDivisionError as exc:
+            raise DiceOperatorError(OPERATOR_ERROR) from exc
+        return value, f"{left_shown} {self.op} {right_shown}"
+
+
+class Parens:
+    def __init__(self, inner):
+        self.inner = inner
+        self.depth = inner.depth + 1
+
+    def cost(self) -> float:
+        return self.inner.cost()
+
+    def evaluate(self) -> tuple[int | float, str]:
+        value, shown = self.inner.evaluate()
+        return value, f"({shown})"
+
+
+class Parser:
+    def __init__(self, expression: str):
+        self.tokens = [
+            token for token in SEPARATORS.split(expression) if token
+        ]
+        self.position = 0
+        self.nesting = 0
+        for token in self.tokens:
+            if SEPARATORS.fullmatch(token) and token not in "()+-*/":
+                raise Unsupported(token)
+
+    def peek(self) -> str | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise DiceOperatorError(OPERATOR_ERROR)
+        self.position += 1
+        return token
+
+    def shallow(self, node):
+        if node.depth > MAX_DEPTH:
+            raise DiceOperatorError(OPERATOR_ERROR)
+        return node
+
+    def parse(self):
+        node = self.sum()
+        if self.peek() is not None:
+            raise DiceOperatorError(OPERATOR_ERROR)
+        return node
+
+    def sum(self):
+        node = self.product()
+        while self.peek() in ("+", "-"):
+            node = self.shallow(Binary(self.take(), node, self.product()))
+        return node
+
+    def product(self):
+        node = self.unary()
+        while self.peek() in ("*", "/"):
+            node = self.shallow(Binary(self.take(), node, self.unary()))
+        return node
+
+    def unary(self):
+        signs = []
+        while self.peek() in ("+", "-"):
+            signs.append(self.take())
+        node = self.atom()
+        for op in reversed(signs):
+            node = self.shallow(Unary(op, node))
+        return node
+
+    def atom(self):
+        token = self.take()
+        if token == "(":
+            self.nesting += 1
+            if self.nesting > MAX_NESTING:
+                raise DiceOperatorError(OPERATOR_ERROR)
+            node = self.shallow(Parens(self.sum()))
+            if self.take() != ")":
+                raise DiceOperatorError(OPERATOR_ERROR)
+            self.nesting -= 1
+            return node
+        if LITERAL.fullmatch(token):
+            return Number(token)
+        if "d" in token:
+            return Dice(token)
+        raise Unsupported(token)
+
+
+def _rolldice(expression: str) -> Result:
+    try:
+        total, explanation = rolldice.roll_dice(expression)
+    except rolldice.DiceGroupException as exc:
+        raise DiceGroupError(str(exc)) from exc
+    except rolldice.DiceOperatorException as exc:
+        raise DiceOperatorError(str(exc)) from exc
+    explanation = explanation.replace(",", ", ").replace("a", "+")
+    return Result(total, explanation)
+
+
+def _fallback_rolls(group: re.Match) -> float:
+    count, sides = int(group["count"] or 1), int(group["sides"])
+    if not group["again"] or sides < 1:
+        return count
+    target = int(group["target"] or 1)
+    # chance a single die has to be rolled again
+    match group["compare"]:
+        case ">":
+            chance = (sides - target) / sides
+        case "<":
+            chance = (target - 1) / sides
+        case _:
+            chance = 1 / sides
+    chance = min(max(chance, 0), 1)
+    if group["again"] == "r":
+        return count * (1 + chance)
+    if chance == 1:
+        return float("inf")
+    return count / (1 - chance)
+
+
+def _fallback_cost(expression: str) -> float:
+    # rolldice syntax is only skimmed here for the dice it rolls, and
+    # rolldice slows down with the square of the number of dice
+    count = sum(map(_fallback_rolls, FALLBACK_GROUP.finditer(expression)))
+    return count * (1 + count / 1000) + len(expression)
+
+
+class Expression:
+    def __init__(self, expression: str):
+        self.expression = expression
+        try:
+            self.root = Parser(expression).parse()
+            self.cost = self.root.cost()
+        except Unsupported:
+            self.root = None
+            self.cost = _fallback_cost(expression)
+        if self.cost > BUDGET:
+            raise DiceBudgetError(expression)
+
+    def roll(self) -> Result:
+        if self.root is None:
+            # rolldice can't be interrupted, so big rolls only happen in a
+            # worker that can be killed
+            if self.cost > INLINE_COST:
+                raise DiceBudgetError(self.expression)
+            return _rolldice(self.expression)
+
+        total, explanation = self.root.evaluate()
+        return Result(total, explanation)
+
+    async def evaluate(self) -> Result:
+        # small rolls are quicker than the trip to another process, but
+        # rolldice is only ever guessed at, so it never gets the loop
+        if self.root is not None and self.cost <= INLINE_COST:
+            return self.roll()
+        return await ROLLERS.roll(self.expression)
+
+
+def _roll(expression: str) -> Result:
+    plan = compile(expression)
+    if plan.root is None:
+        return _rolldice(plan.expression)
+    return plan.roll()
+
+
+class Rollers:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.__pool: ProcessPoolExecutor | None = None
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        if self.__pool is None:
+            self.__pool = workers.process_pool()
+        return self.__pool
+
+    def __kill(self):
+        # a worker stuck in a roll can't be cancelled, only terminated
+        pool, self.__pool = self.__pool, None
+        if pool is None:
+            return
+        for process in list(pool._processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def roll(self, expression: str) -> Result:
+        loop = asyncio.get_running_loop()
+        rolling = loop.run_in_executor(self.__get_pool(), _roll, expression)
+        try:
+            return await asyncio.wait_for(rolling, self.timeout)
+        except asyncio.TimeoutError:
+            self.__kill()
+            raise DiceTimeoutError(expression) from None
+        except BrokenProcessPool:
+            # another roll timed out and took this one's worker with it
+            raise DiceTimeoutError(expression) from None
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+
+
+def normalize_implication(dice_syn: str, implication: str = ""):
+    sub_str = r"\1{}".format(implication)
+    dice_syn = re.sub(INITIAL_DICE_SYNTAX, sub_str, dice_syn)
+    if implication and dice_syn[0] == "1":
+        dice_syn = "2" + dice_syn[1:]
+    return dice_syn
+
+
+@functools.lru_cache(maxsize=1024)
+def compile(expression: str, implication: str = "") -> Expression:
+    expression = "".join(expression.split())
+    expression = re.sub(r"(?<=d)%", "100", expression)
+    expression = normalize_implication(expression, implication)
+    return Expression(expression)
+
+
+def roll(expression: str, implication: str = "") -> Result:
+    return compile(expression, implication).roll()
+
+
+async def evaluate(expression: str, implication: str = "") -> Result:
+    return await compile(expression, implication).evaluate()
+
+
+async def validate(expression: str) -> Expression:
+    # rolldice only finds mistakes by rolling, so expressions it handles are
+    # checked the way they would be rolled, under the same time limit
+    plan = compile(expression)
+    if plan.root is None:
+        await plan.evaluate()
+    return plan
+
+
+ROLLERS = Rollers(config.CONFIG.dice_timeout)
+metrics.METRICS.lru("dice_compile", compile)
@@ -0,0 +1,169 @@
+import functools
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from aiohttp import web
+
+# seconds, the last bucket catches everything slower
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # only as precise as the buckets, returns the bucket's upper bound
+        seen = 0
+        for bound, count in zip(BUCKETS + [float("inf")], self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.latency: dict[str, Histogram] = {}
+        self.errors: Counter[str] = Counter()
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.bytes: Counter[str] = Counter()
+        # name -> function returning {label: value}, read when scraped
+        self.__gauges: dict = {}
+        self.__runner: web.AppRunner | None = None
+
+    def observe(self, name: str, seconds: float, failed: bool = False):
+        self.latency.setdefault(name, Histogram()).observe(seconds)
+        if failed:
+            self.errors[name] += 1
+
+    def cache(self, name: str, hit: bool):
+        if hit:
+            self.hits[name] += 1
+        else:
+            self.misses[name] += 1
+
+    def io(self, direction: str, size: int):
+        self.bytes[direction] += size
+
+    def gauge(self, name: str, callback):
+        self.__gauges[name] = callback
+
+    def lru(self, name: str, func):
+        # functools caches already count for themselves
+        def read() -> dict:
+            info = func.cache_info()
+            return {"hits": info.hits, "misses": info.misses}
+
+        self.gauge(f"lru_{name}", read)
+
+    def timed(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started, failed = time.perf_counter(), True
+            try:
+                result = await func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                self.observe(func.__name__, elapsed, failed)
+
+        return wrapper
+
+    def ratios(self) -> dict[str, float]:
+        ratios = {}
+        for name in self.hits | self.misses:
+            total = self.hits[name] + self.misses[name]
+            ratios[name] = self.hits[name] / total
+        for name, callback in self.__gauges.items():
+            values = callback()
+            if name.startswith("lru_") and values["hits"] + values["misses"]:
+                total = values["hits"] + values["misses"]
+                ratios[name[4:]] = values["hits"] / total
+        return ratios
+
+    def render(self) -> str:
+        lines = ["# TYPE walze_command_seconds histogram"]
+        for name, histogram in sorted(self.latency.items()):
+            seen = 0
+            for bound, count in zip(BUCKETS + ["+Inf"], histogram.counts):
+                seen += count
+                lines.append(
+                    f'walze_command_seconds_bucket{{command="{name}",'
+                    f'le="{bound}"}} {seen}'
+                )
+            label = f'{{command="{name}"}}'
+            lines.append(f"walze_command_seconds_sum{label} {histogram.sum}")
+            count = histogram.count
+            lines.append(f"walze_command_seconds_count{label} {count}")
+
+        counters = [
+            ("command_errors", "command", self.errors),
+            ("cache_hits", "cache", self.hits),
+            ("cache_misses", "cache", self.misses),
+            ("sheet_io_bytes", "direction", self.bytes),
+        ]
+        for metric, label, counter in counters:
+            lines.append(f"# TYPE walze_{metric} counter")
+            for name, value in sorted(counter.items()):
+                sample = f'walze_{metric}_total{{{label}="{name}"}}'
+                lines.append(f"{sample} {value}")
+
+        for metric, callback in sorted(self.__gauges.items()):
+            lines.append(f"# TYPE walze_{metric} gauge")
+            for name, value in callback().items():
+                lines.append(f'walze_{metric}{{name="{name}"}} {value}')
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        lines = []
+        for name, histogram in sorted(self.latency.items()):
+            mean = histogram.sum / histogram.count * 1000
+            p99 = histogram.quantile(0.99) * 1000
+            lines.append(
+                f"{name:<24}{histogram.count:>6} calls {mean:>7.1f}ms mean "
+                f"<{p99:g}ms p99 {self.errors[name]:>3} errors"
+            )
+        for name, ratio in sorted(self.ratios().items()):
+            lines.append(f"{name:<24}{ratio:>7.1%} cache hits")
+        for direction, size in sorted(self.bytes.items()):
+            lines.append(f"sheets {direction:<17}{size:>7} bytes")
+        return "\n".join(lines)
+
+    async def __scrape(self, _request: web.Request) -> web.Response:
+        body = self.render().encode()
+        return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self, host: str, port: int):
+        if not port or self.__runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.__scrape)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        try:
+            await web.TCPSite(self.__runner, host, port).start()
+        except OSError as exc:
+            logging.error(f"Failed to serve metrics on {host}:{port}: {exc}")
+
+    async def close(self):
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+
+
+METRICS = Metrics()
+timed = METRICS.timed
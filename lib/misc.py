@@ -1,13 +1,16 @@
-import json
+import functools
 import random
-import re
 
-import aiofiles
 import interactions
 import pyfiglet
-from interactions import CommandContext, Embed, Member, User
+from interactions import Embed, Member, User
 
-from lib import constants
+from lib import constants, metrics, trials
+
+# parsing the font used to be most of the work of every roll
+FIGLET = pyfiglet.Figlet(font="fraktur", width=60)
+# anything longer than this never fits in an embed field once rendered
+BANNER_LENGTH = 5
 
 stats = [
     "Acrobatics",
@@ -74,7 +77,7 @@ def roll_dice(
     if implication and rolls < 2:
         rolls = 2
 
-    random_nums = [random.randint(1, sides) for _ in range(0, rolls)]
+    random_nums = random.choices(range(1, sides + 1), k=rolls)
     match implication:
         case "adv":
             final_num = max(random_nums)
@@ -87,19 +90,10 @@ def roll_dice(
 
 
 async def open_stats(author: Member):
-    char = CharRepr(author)
-    try:
-        content = constants.SHEETS.read()
-        content: dict = json.loads(content)
-    except json.JSONDecodeError:
-        content: dict = json.loads("{}")
+    if str(author.id) not in constants.SHEETS:
+        constants.SHEETS.insert(CharRepr(author).character)
 
-    if content.get(str(author.id)) is None or content == {}:
-        async with aiofiles.open("stats.json", "w") as save:
-            content.update(char.character)
-            await save.write(json.dumps(content, indent=4))
-
-    return content
+    return constants.SHEETS.content
 
 
 def create_choice(choice: str, value: str = ""):
@@ -129,117 +123,148 @@ def to_button(
     return interactions.Button(style=style, label=label, custom_id=id)
 
 
-# ttps://stackoverflow.com/a/65038809
-def wrap_spell(source_text, separator_chars, width=1024, keep_separators=True):
-    current_length = 0
-    latest_separator = -1
-    current_chunk_start = 0
-    output = ""
-    char_index = 0
-    while char_index < len(source_text):
-        if source_text[char_index] in separator_chars:
-            latest_separator = char_index
-        output += source_text[char_index]
-        current_length += 1
-        if current_length == width:
-            if latest_separator >= current_chunk_start:
-                # Valid earlier separator, cut there
-                cutting_length = char_index - latest_separator
-                if not keep_separators:
-                    cutting_length += 1
-                if cutting_length:
-                    output = output[:-cutting_length]
-                output += "<linebreak>"
-                current_chunk_start = latest_separator + 1
-                char_index = current_chunk_start
-            else:
-                # No separator found, hard cut
-                output += "<linebreak>"
-                current_chunk_start = char_index + 1
-                latest_separator = current_chunk_start - 1
-                char_index += 1
-            current_length = 0
-        else:
-            char_index += 1
-    return output
-
-
-def spell_embed(ctx: CommandContext, spell: str, spell_json: dict):
-    level_school = spell_json.get("School")
-    casting_time = spell_json.get("Casting Time")
-    spell_range = spell_json.get("Range")
-    components = spell_json.get("Components")
-    duration = spell_json.get("Duration")
-    description = spell_json.get("Description")
-    at_higher_levels = spell_json.get("At Higher Levels")
-    source = spell_json.get("Source")
-
-    author = ctx.author
-    title = spell
-    idx = 0 if 'cantrip' in level_school else 1
-    school: str = level_school.split(" ")[idx].replace(".", "")
-
-    match school:
-        case "abjuration":
-            spell_icon = "https://i.imgur.com/H8cB8mv.png"
-        case "conjuration":
-            spell_icon = "https://i.imgur.com/jjtwfqF.png"
-        case "divination":
-            spell_icon = "https://i.imgur.com/6kQkFHa.png"
-        case "enchantment":
-            spell_icon = "https://i.imgur.com/rfeTLTh.png"
-        case "evocation":
-            spell_icon = "https://i.imgur.com/pTpQUGV.png"
-        case "illusion":
-            spell_icon = "https://i.imgur.com/uEWl5eS.png"
-        case "necromancy":
-            spell_icon = "https://i.imgur.com/Aw5eUkK.png"
-        case "transmutation":
-            spell_icon = "https://i.imgur.com/r7ucT57.png"
-        case _:
-            spell_icon = ""
-
-    embed_initial = interactions.Embed(
-        title=title,
-        description=f"*{level_school}*",
-        thumbnail=interactions.EmbedImageStruct(
-            url=spell_icon, height=200, width=200
-        ),
-        color=0xE2E0DD,
-    )
-    embed_initial.set_author(author_name(author), icon_url=author_url(author))
-    meta = f"**Casting Time**: {casting_time}\n"
-    meta += f"**Range**: {spell_range}\n"
-    meta += f"**Components**: {components}\n"
-    meta += f"**Duration**: {duration}\n"
-    embed_initial.add_field(
-        name="Meta",
-        value=meta,
-    )
-
-    if len(description) > 1024:  # embed limit
-        split_descriptions = wrap_spell(
-            description, separator_chars=["."]
-        ).split("<linebreak>")
-    else:
-        split_descriptions = [description]
-
-    first_desc = split_descriptions.pop(0)
-    embed_initial.add_field(name="Description", value=first_desc)
-    embeds = (
-        [
+def wrap_spell(text: str, width: int = 1024, limit: int = 6000) -> list:
+    # every cut is found with one rfind over the window just read, so the
+    # text is only walked once
+    chunks = []
+    start = last_room = 0
+    while start < len(text):
+        room = min(width, limit)
+        # a sliver of text in an embed of its own helps nobody, the wiki
+        # button has the rest
+        if room <= 0 or (chunks and room < min(len(text) - start, width // 4)):
+            break
+        end = start + room
+        if end < len(text):
+            # a sentence ending early on would leave a stub of a chunk
+            cut = text.rfind(".", start + room // 2, end) + 1
+            if cut <= start:
+                cut = text.rfind(" ", start, end) + 1
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+            last_room = room
+        limit -= end - start
+        start = end
+
+    # out of room for the rest, the wiki button has the full text
+    if start < len(text) and chunks:
+        last = chunks[-1]
+        if last.endswith("."):
+            last = last[:-1]
+        elif len(last) >= last_room:
+            # no space left for the ellipsis, give up the last word instead
+            last = last[: last.rfind(" ")].rstrip() or last[:-1]
+        chunks[-1] = last + "\u2026"
+    return chunks
+
+
+SCHOOL_ICONS = {
+    "abjuration": "https://i.imgur.com/H8cB8mv.png",
+    "conjuration": "https://i.imgur.com/jjtwfqF.png",
+    "divination": "https://i.imgur.com/6kQkFHa.png",
+    "enchantment": "https://i.imgur.com/rfeTLTh.png",
+    "evocation": "https://i.imgur.com/pTpQUGV.png",
+    "illusion": "https://i.imgur.com/uEWl5eS.png",
+    "necromancy": "https://i.imgur.com/Aw5eUkK.png",
+    "transmutation": "https://i.imgur.com/r7ucT57.png",
+}
+# discord usernames are at most this long
+AUTHOR_LENGTH = 32
+
+
+class SpellTemplate:
+    # everything about a spell reply except who cast it, built once per spell
+    def __init__(self, spell: str, spell_json: dict):
+        self.spell_json = spell_json
+        self.title = spell
+        self.level_school = spell_json.get("School")
+        casting_time = spell_json.get("Casting Time")
+        spell_range = spell_json.get("Range")
+        components = spell_json.get("Components")
+        duration = spell_json.get("Duration")
+        description = spell_json.get("Description")
+        self.at_higher_levels = spell_json.get("At Higher Levels")
+        self.source = spell_json.get("Source")
+
+        idx = 0 if "cantrip" in self.level_school else 1
+        school: str = self.level_school.split(" ")[idx].replace(".", "")
+        self.spell_icon = SCHOOL_ICONS.get(school, "")
+
+        meta = f"**Casting Time**: {casting_time}\n"
+        meta += f"**Range**: {spell_range}\n"
+        meta += f"**Components**: {components}\n"
+        meta += f"**Duration**: {duration}\n"
+        self.meta = meta
+
+        # discord refuses messages with more than 6000 characters of embeds,
+        # the 64 leaves room for the field names and formatting
+        used = len(spell) + len(self.level_school) + len(meta)
+        used += len(self.source or "") + len(self.at_higher_levels or "")
+        used += AUTHOR_LENGTH + 64
+        self.descriptions = wrap_spell(description, limit=6000 - used)
+        if not self.descriptions:
+            self.descriptions = [description]
+
+        # nothing past the first embed depends on the caster, so it is shared
+        self.rest = [
             interactions.Embed(description=desc, color=0xE2E0DD)
-            for desc in split_descriptions
+            for desc in self.descriptions[1:]
         ]
-        if len(split_descriptions) > 0
-        else []
-    )
-    embeds.insert(0, embed_initial)
-    if at_higher_levels:
-        embeds[-1].add_field(name="At Higher Levels", value=at_higher_levels)
+        if self.rest:
+            self.finish(self.rest[-1])
+
+        rollable = description + (self.at_higher_levels or "")
+        found_dice = [
+            dice.replace(" ", "")
+            for dice in constants.SPELL_DICE_SYNTAX.findall(rollable)
+        ]
+        self.dice = [*dict.fromkeys(found_dice)]
+
+    def finish(self, embed: Embed):
+        if self.at_higher_levels:
+            embed.add_field(
+                name="At Higher Levels", value=self.at_higher_levels
+            )
+        embed.set_footer(self.source)
+
+    def embeds(self, author: Member | User) -> list:
+        embed_initial = interactions.Embed(
+            title=self.title,
+            description=f"*{self.level_school}*",
+            thumbnail=interactions.EmbedImageStruct(
+                url=self.spell_icon, height=200, width=200
+            ),
+            color=0xE2E0DD,
+        )
+        embed_initial.set_author(
+            author_name(author), icon_url=author_url(author)
+        )
+        embed_initial.add_field(name="Meta", value=self.meta)
+        embed_initial.add_field(name="Description", value=self.descriptions[0])
+        if not self.rest:
+            self.finish(embed_initial)
+        return [embed_initial, *self.rest]
+
+    def buttons(self) -> list:
+        # buttons get disabled after use, so every reply needs its own
+        return [to_button(dice) for dice in self.dice]
+
 
-    embeds[-1].set_footer(source)
-    return embeds
+SPELL_TEMPLATES: dict[str, SpellTemplate] = {}
+
+
+def spell_template(spell: str, spell_json: dict) -> SpellTemplate:
+    template = SPELL_TEMPLATES.get(spell)
+    # a refetched spell may have changed on the wiki
+    stale = template is None or template.spell_json != spell_json
+    metrics.METRICS.cache("spell_template", not stale)
+    if stale:
+        template = SpellTemplate(spell, spell_json)
+        SPELL_TEMPLATES[spell] = template
+    return template
 
 
 async def user_check(ctx):
@@ -255,11 +280,21 @@ async def user_check(ctx):
     return False
 
 
+@functools.lru_cache(maxsize=512)
+def banner(result: str) -> str:
+    if len(result) > BANNER_LENGTH:
+        return f"**{result}**"
+    figlet = FIGLET.renderText(result).replace("`", "\u200b`")
+    return f"```{figlet}```" if len(figlet) <= 1024 else f"**{result}**"
+
+
+metrics.METRICS.lru("banner", banner)
+
+
 def unstable_roll_embed(
     author: User | Member,
     dice_expr: str,
-    result,
-    explanation: str,
+    rolled,
     implication: str = "",
 ):
     if "K" in dice_expr:
@@ -269,7 +304,7 @@ def unstable_roll_embed(
     title = dice_expr.replace("k", "", 1).replace("K", "", 1).replace("*", "\*")
     embed = interactions.Embed(title=title, color=0xE2E0DD)
     embed.set_author(name=author_name(author), icon_url=author_url(author))
-    explanation = explanation.replace(",", ", ").replace("a", "+")
+    result = rolled.total
 
     match implication:
         case "k":
@@ -279,36 +314,26 @@ def unstable_roll_embed(
         case _:
             pass
 
-    embed.add_field("Products", explanation)
-    figlet = pyfiglet.figlet_format(str(result), "fraktur", width=60).replace(
-        "`", "\u200b`"
-    )
-    result_field = f"```{figlet}```" if len(figlet) <= 1024 else f"**{result}**"
-    embed.add_field("Result", result_field, inline=False)
+    embed.add_field("Products", rolled.explanation)
+    embed.add_field("Result", banner(str(result)), inline=False)
     embed.set_footer(f"{result}")
     return embed
 
 
-def stats_embed(author: User | Member, dice: list, syn: str):
+def stats_embed(author: User | Member, stats: list, syn: str):
     embed = interactions.Embed(title=syn, color=0xE2E0DD)
     embed.set_author(name=author_name(author), icon_url=author_url(author))
-    for res, expl in dice:
+    for rolled in stats:
         embed.add_field(
-            expl.replace(",", ", "), "**" + str(res) + "**", inline=True
+            rolled.explanation, "**" + str(rolled.total) + "**", inline=True
         )
 
-    embed.set_footer(f"Total Stats: {sum([s for s, _ in dice])}")
+    total = sum([s.total for s in stats])
+    points = sum([trials.point_buy(int(s.total)) for s in stats])
+    embed.set_footer(f"Total Stats: {total} ({points} point buy)")
     return embed
 
 
-def normalize_implication(dice_syn: str, implication: str = ""):
-    sub_str = r"\1{}".format(implication)
-    dice_syn = re.sub(constants.INITIAL_DICE_SYNTAX, sub_str, dice_syn)
-    if implication and dice_syn[0] == "1":
-        dice_syn = "2" + dice_syn[1:]
-    return dice_syn
-
-
 def author_name(author: Member | User):
     if isinstance(author, Member):
         return author.user.username
@@ -0,0 +1,166 @@
+import functools
+from math import comb
+
+from lib import dice
+
+# explosion chains are cut off once they are less likely than this
+NEGLIGIBLE = 1e-12
+# rough number of steps a whole distribution may take before it is refused,
+# a couple of seconds at most
+MAX_WORK = 5_000_000
+
+
+class TooComplex(dice.DiceError):
+    # built when shown, so the error survives the trip back from a worker
+    def __str__(self) -> str:
+        return f"Can't work out the odds of {self.args[0]}"
+
+
+class Work:
+    # shared by every step of one distribution, so a long chain of cheap
+    # steps is refused as well as one expensive step, and always before
+    # the step is taken
+    def __init__(self, limit: int):
+        self.left = limit
+
+    def spend(self, steps: int):
+        self.left -= steps
+        if self.left < 0:
+            raise OverflowError
+
+
+def _convolve(left: dict, right: dict, op) -> dict:
+    combined = {}
+    for a, p in left.items():
+        for b, q in right.items():
+            value = op(a, b)
+            combined[value] = combined.get(value, 0.0) + p * q
+    return combined
+
+
+def _die(node: dice.Dice) -> dict:
+    faces = node.faces
+    chance = 1 / node.sides
+
+    if node.reroll == "R":
+        # rerolling until it is gone is the same as never rolling it
+        chance = 1 / (node.sides - 1)
+        return {face: chance for face in faces if face != node.rerolled}
+    if node.reroll == "r":
+        single = {face: chance + chance * chance for face in faces}
+        single[node.rerolled] = chance * chance
+        return single
+
+    if node.explode:
+        single = {}
+        carried, reach = 0, chance
+        while reach > NEGLIGIBLE:
+            for face in faces:
+                if face != node.exploding:
+                    value = carried + face
+                    single[value] = single.get(value, 0.0) + reach
+            carried += node.exploding
+            reach *= chance
+        return single
+
+    return {face: chance for face in faces}
+
+
+def _kept(node: dice.Dice) -> dict:
+    # every die left over is uniform over the faces not dealt with yet, so
+    # going through the faces best first settles how many dice show each one
+    faces = list(node.faces)
+    if node.keep in "KX":
+        faces.reverse()
+
+    # (dice left, dice still to keep) -> {kept total: chance}
+    states = {(node.count, node.kept): {0: 1.0}}
+    for i, face in enumerate(faces):
+        chance = 1 / (len(faces) - i)
+        following = {}
+        for (left, keeping), totals in states.items():
+            for showing in range(left + 1):
+                p = (
+                    comb(left, showing)
+                    * chance**showing
+                    * (1 - chance) ** (left - showing)
+                )
+                if p == 0:
+                    continue
+                taken = min(showing, keeping)
+                state = (left - showing, keeping - taken)
+                merged = following.setdefault(state, {})
+                for total, q in totals.items():
+                    value = total + taken * face
+                    merged[value] = merged.get(value, 0.0) + p * q
+        states = following
+
+    return states[(0, 0)]
+
+
+def _dice(node: dice.Dice, work: Work) -> dict:
+    if node.keep:
+        work.spend(node.count**2 * node.kept * node.sides**2)
+        return _kept(node)
+
+    single = _die(node)
+    # the total widens by a die's worth of values with every die added
+    work.spend((node.count * len(single)) ** 2 // 2)
+    total = {0: 1.0}
+    for _ in range(node.count):
+        total = _convolve(total, single, dice.OPERATORS["+"])
+
+    match node.each:
+        case "a":
+            shift = node.amount * node.count
+        case "s":
+            shift = -node.amount * node.count
+        case "m":
+            return {value * node.amount: p for value, p in total.items()}
+        case _:
+            return total
+    return {value + shift: p for value, p in total.items()}
+
+
+def _distribution(node, work: Work) -> dict:
+    match node:
+        case dice.Number():
+            return {node.value: 1.0}
+        case dice.Dice():
+            return _dice(node, work)
+        case dice.Unary(op="-"):
+            operand = _distribution(node.operand, work)
+            return {-value: p for value, p in operand.items()}
+        case dice.Unary():
+            return _distribution(node.operand, work)
+        case dice.Parens():
+            return _distribution(node.inner, work)
+        case dice.Binary():
+            left = _distribution(node.left, work)
+            right = _distribution(node.right, work)
+            if node.op == "/" and 0 in right:
+                raise dice.DiceOperatorError(dice.OPERATOR_ERROR)
+            work.spend(len(left) * len(right))
+            return _convolve(left, right, dice.OPERATORS[node.op])
+    raise TypeError(node)
+
+
+@functools.lru_cache(maxsize=256)
+def distribution(expression: str) -> dict:
+    plan = dice.compile(expression)
+    if plan.root is None:
+        raise TooComplex(expression)
+    try:
+        return _distribution(plan.root, Work(MAX_WORK))
+    except OverflowError:
+        raise TooComplex(expression) from None
+
+
+def at_least(expression: str, target: int) -> float:
+    pmf = distribution(expression)
+    return min(sum(p for value, p in pmf.items() if value >= target), 1.0)
+
+
+def mean(expression: str) -> float:
+    pmf = distribution(expression)
+    return sum(value * p for value, p in pmf.items())
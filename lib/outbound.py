@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+import interactions
+
+
+class Outbound:
+    # discord's per route buckets are already tracked by the library, this
+    # only decides what goes out first
+    def __init__(self, concurrency: int = 2, patience: float = 1.0):
+        self.__limit = asyncio.Semaphore(concurrency)
+        # longest an edit holds off for responses, under steady load there
+        # is always one going out
+        self.__patience = patience
+        self.__responding = 0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+        # message -> (context to edit through, latest changes)
+        self.__edits: dict[int, tuple[interactions.CommandContext, dict]] = {}
+        self.__editing: dict[int, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self.__edits)
+
+    async def send(self, ctx: interactions.CommandContext, **kwargs):
+        # responses have a deadline, so edits hold off while any are going out
+        self.__responding += 1
+        self.__idle.clear()
+        try:
+            return await ctx.send(**kwargs)
+        finally:
+            self.__responding -= 1
+            if not self.__responding:
+                self.__idle.set()
+
+    def edit(self, ctx: interactions.CommandContext, **kwargs):
+        key = int(ctx.id)
+        if key in self.__edits:
+            # only the newest state of a message is worth sending
+            kwargs = {**self.__edits[key][1], **kwargs}
+        self.__edits[key] = (ctx, kwargs)
+        if key not in self.__editing:
+            self.__editing[key] = asyncio.create_task(self.__flush(key))
+
+    async def __flush(self, key: int):
+        try:
+            async with self.__limit:
+                try:
+                    await asyncio.wait_for(self.__idle.wait(), self.__patience)
+                except asyncio.TimeoutError:
+                    pass
+                ctx, kwargs = self.__edits.pop(key)
+                await ctx.edit(**kwargs)
+        except interactions.LibraryException as exc:
+            logging.error(f"Failed to edit message: {exc}")
+        except Exception:
+            # nothing awaits this task, so anything not logged here is lost
+            logging.exception("Failed to edit message")
+        finally:
+            del self.__editing[key]
+            # edits that came in while this one was being sent
+            if key in self.__edits:
+                self.__editing[key] = asyncio.create_task(self.__flush(key))
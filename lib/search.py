@@ -0,0 +1,56 @@
+from bisect import bisect_left
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, items: list[tuple[str, str]]):
+        self.items = items
+        self.__names = [name.lower() for name, _ in items]
+        # sorted names make every prefix match one contiguous run
+        self.__prefixes = sorted(
+            (name, i) for i, name in enumerate(self.__names)
+        )
+        self.__trigrams: dict[str, set[int]] = {}
+        for i, name in enumerate(self.__names):
+            for trigram in trigrams(name):
+                self.__trigrams.setdefault(trigram, set()).add(i)
+
+    def __prefixed(self, query: str, limit: int) -> list[int]:
+        found = []
+        start = bisect_left(self.__prefixes, (query,))
+        for name, i in self.__prefixes[start : start + limit]:
+            if not name.startswith(query):
+                break
+            found.append(i)
+        return found
+
+    def __containing(self, query: str) -> list[int]:
+        if len(query) < 3:
+            candidates = range(len(self.__names))
+        else:
+            postings = [
+                self.__trigrams.get(trigram, set())
+                for trigram in trigrams(query)
+            ]
+            candidates = sorted(set.intersection(*postings))
+        return [i for i in candidates if query in self.__names[i]]
+
+    def search(self, query: str, limit: int = 25) -> list[tuple[str, str]]:
+        query = query.lower()
+        if not query:
+            return self.items[:limit]
+
+        # names starting with the query first, then a word inside the name,
+        # then anything else containing it
+        ranked = self.__prefixed(query, limit)
+        if len(ranked) < limit:
+            seen = set(ranked)
+            rest = [i for i in self.__containing(query) if i not in seen]
+            words = [i for i in rest if f" {query}" in self.__names[i]]
+            seen.update(words)
+            ranked += words + [i for i in rest if i not in seen]
+
+        return [self.items[i] for i in ranked[:limit]]
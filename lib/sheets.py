@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from lib import metrics
+
+
+def write_atomic(filename: str, data: str):
+    # written next to the original and renamed over it, so a crash mid-write
+    # can never leave a truncated file behind
+    temp = filename + ".tmp"
+    with open(temp, "w", encoding="utf-8") as snapshot:
+        snapshot.write(data)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temp, filename)
+
+
+def join_sheets(sheets: dict[str, str]) -> str:
+    # sheets dumped one by one, stitched together into a single object
+    users = (f"{json.dumps(user)}: {sheet}" for user, sheet in sheets.items())
+    return "{" + ", ".join(users) + "}"
+
+
+def pretty(sheets: dict[str, str]) -> str:
+    return json.dumps(
+        {user: json.loads(sheet) for user, sheet in sheets.items()}, indent=4
+    )
+
+
+def _append_journal(filename: str, lines: list[str]):
+    with open(filename, "a", encoding="utf-8") as journal:
+        journal.writelines(lines)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+# every sheet in one snapshot file, plus an append-only change journal
+class JournalBackend:
+    def __init__(self, filename: str, compact_after: int = 500):
+        self.filename = filename
+        self.journal = filename + ".journal"
+        self.compact_after = compact_after
+        self.__journaled = 0
+        if not Path(filename).is_file():
+            open(filename, "w+", encoding="utf-8").close()
+
+    def load(self) -> dict:
+        metrics.METRICS.io("read", os.path.getsize(self.filename))
+        with open(self.filename, "r", encoding="utf-8") as file:
+            try:
+                sheets: dict = json.loads(file.read())
+            except json.JSONDecodeError:
+                sheets: dict = {}
+
+        if not Path(self.journal).is_file():
+            return sheets
+
+        metrics.METRICS.io("read", os.path.getsize(self.journal))
+        intact, torn = [], False
+        with open(self.journal, "r", encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash mid-append only ever damages the last line
+                    logging.warning(f"Skipping torn entry in {self.journal}")
+                    torn = True
+                    continue
+                sheets[entry["id"]] = entry["sheet"]
+                intact.append(line.rstrip("\n") + "\n")
+                self.__journaled += 1
+
+        if torn:
+            # otherwise the next append would be glued onto the torn line
+            # and lost along with it
+            write_atomic(self.journal, "".join(intact))
+
+        if self.__journaled:
+            replayed = f"Replayed {self.__journaled} entries"
+            logging.info(f"{replayed} from {self.journal}")
+        return sheets
+
+    @property
+    def pending(self) -> bool:
+        return self.__journaled > 0
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.__journaled >= self.compact_after
+
+    def write(self, changes: dict[str, str]):
+        lines = [
+            f'{{"id": {json.dumps(user)}, "sheet": {sheet}}}\n'
+            for user, sheet in changes.items()
+        ]
+        _append_journal(self.journal, lines)
+        self.__journaled += len(lines)
+        # sheets are dumped as ascii, so characters are bytes
+        metrics.METRICS.io("written", sum(len(line) for line in lines))
+
+    def compact(self, sheets: dict[str, str]):
+        data = join_sheets(sheets)
+        write_atomic(self.filename, data)
+        metrics.METRICS.io("written", len(data))
+        # replaying stale entries over the new snapshot is harmless, so the
+        # journal is only cleared once the snapshot is safely in place
+        open(self.journal, "w", encoding="utf-8").close()
+        self.__journaled = 0
+
+
+# one file per user, so a write only ever touches the users that changed
+class ShardedBackend:
+    pending = False
+    needs_compaction = False
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> dict:
+        sheets = {}
+        for shard in self.directory.glob("*.json"):
+            try:
+                text = shard.read_text("utf-8")
+                metrics.METRICS.io("read", len(text))
+                sheets[shard.stem] = json.loads(text)
+            except json.JSONDecodeError:
+                logging.error(f"Skipping unreadable sheet {shard}")
+        return sheets
+
+    def write(self, changes: dict[str, str]):
+        for user, sheet in changes.items():
+            write_atomic(str(self.directory / f"{user}.json"), sheet)
+            metrics.METRICS.io("written", len(sheet))
+
+    def compact(self, sheets: dict[str, str]):
+        pass
+
+
+def open_backend(kind: str, path: str = "", compact_after: int = 500):
+    match kind:
+        case "sharded":
+            return ShardedBackend(path or "sheets")
+        case "json":
+            return JournalBackend(path or "stats.json", compact_after)
+        case _:
+            raise SystemExit(f"Unknown sheet backend: {kind}")
+
+
+class CharacterSheets:
+    def __init__(
+        self, backend: JournalBackend | ShardedBackend, interval: float = 5.0
+    ):
+        self.backend = backend
+        self.interval = interval
+
+        # loaded once, every command after this is served from memory
+        self.__sheets: dict = backend.load()
+        # every sheet as it was last written, so snapshots can be put together
+        # on another thread without touching sheets the loop is editing
+        self.__serialized: dict[str, str] = {
+            user: json.dumps(sheet) for user, sheet in self.__sheets.items()
+        }
+        self.__dirty: set[str] = set()
+        self.__locks: dict[str, asyncio.Lock] = {}
+        # user -> section -> [(lowercased key, key)], rebuilt after each edit
+        self.__keys: dict[str, dict[str, list[tuple[str, str]]]] = {}
+        self.__flush_lock = asyncio.Lock()
+        self.__flusher: asyncio.Task | None = None
+
+    def __contains__(self, user_id) -> bool:
+        return str(user_id) in self.__sheets
+
+    @property
+    def content(self) -> dict:
+        return self.__sheets
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.__dirty)
+
+    def get(self, user_id) -> dict | None:
+        return self.__sheets.get(str(user_id))
+
+    def keys(self, user_id, section: str) -> list[tuple[str, str]]:
+        cached = self.__keys.setdefault(str(user_id), {})
+        if section not in cached:
+            sheet = self.__sheets.get(str(user_id)) or {}
+            if section != "char":
+                sheet = sheet.get(section) or {}
+            cached[section] = [(key.lower(), key) for key in sheet.keys()]
+        return cached[section]
+
+    def insert(self, character: dict):
+        self.__sheets.update(character)
+        self.__dirty.update(character.keys())
+        for user in character.keys():
+            self.__keys.pop(user, None)
+
+    def lock(self, user_id) -> asyncio.Lock:
+        return self.__locks.setdefault(str(user_id), asyncio.Lock())
+
+    def mark_dirty(self, user_id):
+        self.__dirty.add(str(user_id))
+        self.__keys.pop(str(user_id), None)
+
+    def serialized(self) -> dict[str, str]:
+        # a copy, the strings themselves never change
+        return dict(self.__serialized)
+
+    def __serialize(self, users: set[str]) -> dict[str, str]:
+        changes = {
+            user: json.dumps(self.__sheets[user])
+            for user in users
+            if user in self.__sheets
+        }
+        self.__serialized.update(changes)
+        return changes
+
+    async def flush(self):
+        async with self.__flush_lock:
+            if not self.__dirty:
+                return
+
+            # anything marked while we write is picked up by the next flush
+            flushing, self.__dirty = self.__dirty, set()
+            try:
+                changes = self.__serialize(flushing)
+                await asyncio.to_thread(self.backend.write, changes)
+            except OSError:
+                self.__dirty |= flushing
+                raise
+
+            if self.backend.needs_compaction:
+                await asyncio.to_thread(
+                    self.backend.compact, self.serialized()
+                )
+
+    def flush_sync(self):
+        if self.__dirty:
+            self.backend.write(self.__serialize(self.__dirty))
+            self.__dirty.clear()
+
+        if self.backend.pending:
+            self.backend.compact(self.serialized())
+
+    async def __flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except OSError as exc:
+                logging.error(f"Failed to save character sheets: {exc}")
+
+    def start(self):
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.create_task(self.__flush_periodically())
+
+
+def migrate(source: str, destination: str) -> int:
+    # the journal backend creates a missing file, and a mistyped path would
+    # look like a migration of nobody
+    if not Path(source).is_file():
+        raise SystemExit(f"{source} not found.")
+    sheets = JournalBackend(source).load()
+    ShardedBackend(destination).write(
+        {user: json.dumps(sheet) for user, sheet in sheets.items()}
+    )
+    return len(sheets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage stored character sheets."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser(
+        "migrate", help="Split stats.json into one file per user."
+    )
+    migrate_parser.add_argument("source", nargs="?", default="stats.json")
+    migrate_parser.add_argument("destination", nargs="?", default="sheets")
+    args = parser.parse_args()
+
+    migrated = migrate(args.source, args.destination)
+    print(f"Migrated {migrated} sheets to {args.destination}/")
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import random
+from collections import Counter
+
+from lib import constants, dice, metrics, trials
+
+# stat generation methods suggested by /dicestats
+METHODS = ["d4+d10+2", "3d6", "3d6R", "4d6X3", "2d8+4", "3d6X2+6"]
+# trials are split into batches so every worker has something to do
+BATCH = 10_000
+
+
+class Report:
+    def __init__(self, expression: str, points: Counter, total: int):
+        self.expression = expression
+        self.trials = sum(points.values())
+        # average of a single stat and of the whole array
+        self.mean = total / self.trials / 6
+        self.total = total / self.trials
+        self.points = sum(p * n for p, n in points.items()) / self.trials
+        self.percentiles = {}
+        seen, wanted = 0, [10, 50, 90]
+        for p in sorted(points):
+            seen += points[p]
+            while wanted and seen >= self.trials * wanted[0] / 100:
+                self.percentiles[wanted.pop(0)] = p
+
+    @property
+    def hint(self) -> str:
+        low, high = self.percentiles[10], self.percentiles[90]
+        return (
+            f"{self.expression:<10}({self.points:.0f} point buy, "
+            f"{low} to {high}, mean {self.mean:.1f})"
+        )
+
+
+class Simulator:
+    def __init__(self, trials: int):
+        self.trials = trials
+        self.__reports: dict[str, Report] = {}
+        self.__running: dict[str, asyncio.Future] = {}
+        self.__warmer: asyncio.Task | None = None
+
+    def cached(self, expression: str) -> Report | None:
+        return self.__reports.get(expression)
+
+    async def __simulate(self, expression: str) -> Report:
+        # rejects bad expressions before any worker is bothered with them
+        await dice.validate(expression)
+        sizes = [BATCH] * (self.trials // BATCH)
+        if self.trials % BATCH:
+            sizes.append(self.trials % BATCH)
+        batches = await asyncio.gather(
+            *[
+                constants.WORKERS.process(
+                    trials.batch, expression, size, random.getrandbits(64)
+                )
+                for size in sizes
+            ]
+        )
+        points = sum((points for points, _ in batches), Counter())
+        total = sum(total for _, total in batches)
+        return Report(expression, points, total)
+
+    async def report(self, expression: str) -> Report:
+        report = self.__reports.get(expression)
+        metrics.METRICS.cache("simulation", report is not None)
+        if report is not None:
+            return report
+
+        # everyone asking for the same expression waits on one simulation
+        running = self.__running.get(expression)
+        if running is None:
+            running = asyncio.ensure_future(self.__simulate(expression))
+            self.__running[expression] = running
+        try:
+            report = await asyncio.shield(running)
+        finally:
+            if running.done():
+                self.__running.pop(expression, None)
+        self.__reports[expression] = report
+        return report
+
+    async def warm(self, expressions: list[str]):
+        for expression in expressions:
+            try:
+                await self.report(expression)
+            except dice.DiceError as exc:
+                logging.error(f"Failed to simulate {expression}: {exc}")
+
+    def start(self):
+        if self.__warmer is None or self.__warmer.done():
+            self.__warmer = asyncio.create_task(self.warm(METHODS))
+
+
+SIMULATOR = Simulator(constants.CONFIG.simulation_trials)
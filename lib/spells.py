@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import aiohttp
+
+from lib import constants, metrics, search, sheets, wiki
+
+SPELL_URL = "http://dnd5e.wikidot.com/spell:"
+SPELL_LIST_URL = "https://dnd5e.wikidot.com/spells"
+# slugs name files in the spell cache, so nothing else gets into one
+NOT_SLUG = re.compile(r"[^a-z0-9-]")
+
+
+class SpellFetchError(Exception):
+    def __init__(self, url: str, status_code: int):
+        super().__init__(f"{url} returned {status_code}")
+        self.url = url
+        self.status_code = status_code
+
+
+def slugify(spell: str) -> str:
+    slug = spell.lower().replace(" ", "-").replace("/", "-")
+    return NOT_SLUG.sub("", slug)
+
+
+class Compendium:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.spells: list = []
+        self.entries: dict = {}
+        if not Path(filename).is_file():
+            return
+
+        with open(filename, "r", encoding="utf-8") as file:
+            try:
+                compendium: dict = json.loads(file.read())
+            except json.JSONDecodeError:
+                logging.error(f"Ignoring unreadable compendium {filename}")
+                return
+
+        self.spells = [tuple(spell) for spell in compendium.get("spells", [])]
+        self.entries = compendium.get("entries", {})
+
+    def get(self, slug: str) -> tuple[str, dict] | None:
+        entry = self.entries.get(slug)
+        if entry is None:
+            return None
+        return entry["name"], entry["attrs"]
+
+
+class SpellList:
+    def __init__(self, snapshot: str):
+        self.snapshot = snapshot
+        self.__refresher: asyncio.Task | None = None
+        self.__swap(COMPENDIUM.spells)
+        if self.spells or not Path(snapshot).is_file():
+            return
+
+        with open(snapshot, "r", encoding="utf-8") as file:
+            try:
+                spells = json.loads(file.read())
+            except json.JSONDecodeError:
+                logging.error(f"Ignoring unreadable spell list {snapshot}")
+                return
+        self.__swap([tuple(spell) for spell in spells])
+
+    def __swap(self, spells: list):
+        # readers only ever see the old list or the new one, never a mix
+        self.index = search.SearchIndex(spells)
+        self.spells = spells
+
+    def search(self, query: str, limit: int = 25) -> list[tuple[str, str]]:
+        return self.index.search(query, limit)
+
+    async def refresh(self):
+        try:
+            status_code, page = await constants.WEB.get(SPELL_LIST_URL)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            error = type(exc).__name__
+            logging.error(f"Failed to refresh spell list: {error}")
+            return
+        if status_code != 200:
+            logging.error(f"Failed to refresh spell list: {status_code}")
+            return
+
+        spells = await constants.WORKERS.process(wiki.parse_spell_list, page)
+        if not spells:
+            return
+        self.__swap(spells)
+        await constants.WORKERS.thread(
+            sheets.write_atomic, self.snapshot, json.dumps(spells)
+        )
+
+    def start(self):
+        if self.__refresher is None or self.__refresher.done():
+            self.__refresher = asyncio.create_task(self.refresh())
+
+
+class SpellCache:
+    def __init__(self, directory: str, ttl: float, size: int = 128):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.size = size
+        # slug -> (fetched at, (name, attributes)), least recently used first
+        self.__memory: OrderedDict[str, tuple[float, tuple]] = OrderedDict()
+
+    def __remember(self, slug: str, fetched: float, spell: tuple[str, dict]):
+        self.__memory[slug] = (fetched, spell)
+        self.__memory.move_to_end(slug)
+        while len(self.__memory) > self.size:
+            self.__memory.popitem(last=False)
+
+    def __from_disk(self, slug: str) -> tuple[float, tuple] | None:
+        try:
+            cached = json.loads((self.directory / f"{slug}.json").read_text())
+            return cached["fetched"], (cached["name"], cached["attrs"])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            # anything but a spell we cached is as good as not cached
+            return None
+
+    def __to_disk(self, slug: str, fetched: float, spell: tuple[str, dict]):
+        name, attrs = spell
+        cached = {"fetched": fetched, "name": name, "attrs": attrs}
+        try:
+            sheets.write_atomic(
+                str(self.directory / f"{slug}.json"), json.dumps(cached)
+            )
+        except OSError as exc:
+            logging.error(f"Failed to cache spell {slug}: {exc}")
+
+    def __fresh(self, fetched: float) -> bool:
+        return time.time() - fetched < self.ttl
+
+    async def get(self, spell: str) -> tuple[str, dict]:
+        slug = slugify(spell)
+        entry = COMPENDIUM.get(slug)
+        metrics.METRICS.cache("spell_compendium", entry is not None)
+        if entry is not None:
+            return entry
+
+        cached = self.__memory.get(slug)
+        if cached is None:
+            cached = self.__from_disk(slug)
+        fresh = cached is not None and self.__fresh(cached[0])
+        # a miss here means a trip to the wiki
+        metrics.METRICS.cache("spell_cache", fresh)
+        if fresh:
+            self.__remember(slug, *cached)
+            return cached[1]
+
+        url = SPELL_URL + slug
+        try:
+            status_code, page = await constants.WEB.get(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # an outdated spell is better than none while the wiki is down
+            if cached is not None:
+                return cached[1]
+            raise
+        if status_code != 200:
+            if cached is not None:
+                return cached[1]
+            raise SpellFetchError(url, status_code)
+
+        # parsing a whole wiki page holds the GIL for a good while
+        fetched = time.time()
+        spell = await constants.WORKERS.process(wiki.parse_spell, page)
+        self.__remember(slug, fetched, spell)
+        await constants.WORKERS.thread(self.__to_disk, slug, fetched, spell)
+        return spell
+
+
+async def build(filename: str) -> int:
+    status_code, page = await constants.WEB.get(SPELL_LIST_URL)
+    if status_code != 200:
+        raise SpellFetchError(SPELL_LIST_URL, status_code)
+    spell_list = wiki.parse_spell_list(page)
+
+    async def fetch(slug: str) -> tuple[str, dict] | None:
+        try:
+            status_code, page = await constants.WEB.get(SPELL_URL + slug)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            logging.error(f"Skipping {slug}: {type(exc).__name__}")
+            return None
+        if status_code != 200:
+            logging.error(f"Skipping {slug}: status code {status_code}")
+            return None
+        try:
+            return wiki.parse_spell(page)
+        except IndexError:
+            logging.error(f"Skipping {slug}: page could not be parsed")
+            return None
+
+    parsed = await asyncio.gather(*[fetch(slug) for _, slug in spell_list])
+    entries = {
+        slug: {"name": spell[0], "attrs": spell[1]}
+        for (_, slug), spell in zip(spell_list, parsed)
+        if spell is not None
+    }
+    compendium = {"spells": spell_list, "entries": entries}
+    sheets.write_atomic(filename, json.dumps(compendium))
+    await constants.WEB.close()
+    return len(entries)
+
+
+COMPENDIUM = Compendium(constants.CONFIG.spell_compendium)
+SPELL_LIST = SpellList(constants.CONFIG.spell_list)
+CACHE = SpellCache(
+    constants.CONFIG.spell_cache_dir,
+    constants.CONFIG.spell_cache_ttl,
+    constants.CONFIG.spell_cache_size,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage local spell data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser(
+        "build", help="Download and parse every spell into a compendium."
+    )
+    build_parser.add_argument(
+        "filename", nargs="?", default=constants.CONFIG.spell_compendium
+    )
+    args = parser.parse_args()
+
+    built = asyncio.run(build(args.filename))
+    print(f"Wrote {built} spells to {args.filename}")
@@ -0,0 +1,44 @@
+import random
+from collections import Counter
+
+from lib import dice
+
+# point buy costs, stretched past 8 and 15 the way most tables online do
+POINT_BUY = {
+    3: -9,
+    4: -6,
+    5: -4,
+    6: -2,
+    7: -1,
+    8: 0,
+    9: 1,
+    10: 2,
+    11: 3,
+    12: 4,
+    13: 5,
+    14: 7,
+    15: 9,
+    16: 12,
+    17: 15,
+    18: 19,
+}
+
+
+def point_buy(stat: int) -> int:
+    if stat < 3:
+        return POINT_BUY[3] - 3 * (3 - stat)
+    if stat > 18:
+        return POINT_BUY[18] + 4 * (stat - 18)
+    return POINT_BUY[stat]
+
+
+def batch(expression: str, trials: int, seed: int) -> tuple[Counter, int]:
+    # runs in a worker process, so only plain data goes in and out
+    random.seed(seed)
+    plan = dice.compile(expression)
+    points, total = Counter(), 0
+    for _ in range(trials):
+        stats = [int(plan.roll().total) for _ in range(6)]
+        points[sum(point_buy(stat) for stat in stats)] += 1
+        total += sum(stats)
+    return points, total
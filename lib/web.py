@@ -0,0 +1,31 @@
+import asyncio
+
+import aiohttp
+
+
+class WebClient:
+    def __init__(self, timeout: float = 20.0, concurrency: int = 4):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.concurrency = concurrency
+        self.__limit = asyncio.Semaphore(concurrency)
+        self.__session: aiohttp.ClientSession | None = None
+
+    # sessions have to be created inside the running loop, so this is lazy
+    def __get_session(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency, keepalive_timeout=60
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self.__session
+
+    async def get(self, url: str) -> tuple[int, str]:
+        async with self.__limit:
+            async with self.__get_session().get(url) as response:
+                return response.status, await response.text()
+
+    async def close(self):
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
@@ -0,0 +1,64 @@
+from operator import itemgetter
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+
+def spell_to_dict(web_spell: str) -> tuple[str, dict]:
+    spell_txt = web_spell.splitlines()[1:-9]
+    spell_txt = "\n".join(spell_txt).replace("\u2019", "'")
+    spell_splits: list[str] = spell_txt.splitlines()
+
+    for x in range(1, 4):
+        spell_splits.pop(x)
+
+    spell_lists = spell_splits[-1].split(". ")[-1]
+    name = spell_splits[0]
+    spell_source = spell_splits[3].split(": ")[-1]
+    level_school = (
+        spell_splits[4].split(": ")[-1].lower() + f". ({spell_lists})"
+    )
+    casting_time = spell_splits[5].split(": ")[-1]
+    spell_range = spell_splits[6].split(": ")[-1]
+    components = spell_splits[7].split(": ")[-1]
+    duration = spell_splits[8].split(": ")[-1]
+    proto_description = "\n".join(spell_splits[9:-1])
+
+    if "At Higher Levels." in proto_description:
+        proto_info = proto_description.split("At Higher Levels.")
+        description = "\n".join(proto_info[:-1])
+        at_higher_levels = proto_info[-1].strip()
+    else:
+        description = proto_description
+        at_higher_levels = ""
+
+    return name, {
+        "School": level_school,
+        "Casting Time": casting_time,
+        "Range": spell_range,
+        "Components": components,
+        "Duration": duration,
+        "Description": description,
+        "At Higher Levels": at_higher_levels,
+        "Source": spell_source,
+    }
+
+
+def parse_spell(page: str) -> tuple[str, dict]:
+    soup = BeautifulSoup(
+        page,
+        "html.parser",
+        parse_only=SoupStrainer("div", "main-content"),
+    )
+    return spell_to_dict(soup.get_text())
+
+
+def parse_spell_list(page: str) -> list:
+    soup = BeautifulSoup(page, "html.parser", parse_only=SoupStrainer("a"))
+    # all spells except Homebrew and Unearthed Arcana
+    spells = [
+        (a.contents[0], a.get("href").split(":")[1])
+        for a in soup.find_all("a", href=True)[49:-38]
+        if not any(spell in a.contents[0] for spell in ["HB", "UA"])
+    ]
+    spells.sort(key=itemgetter(1))
+    return spells
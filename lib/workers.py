@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import multiprocessing
+import multiprocessing.forkserver
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+
+# everything handed to a worker process comes from one of these, and none of
+# them import lib.constants, so workers never load the sheets
+PRELOAD = [
+    "lib.dice",
+    "lib.odds",
+    "lib.sheets",
+    "lib.trials",
+    "lib.wiki",
+    "tabulate",
+]
+
+
+def process_context() -> multiprocessing.context.BaseContext:
+    # forking copies whatever locks the bot's threads hold at the time, so
+    # where fork is the default, workers come from a clean fork server that
+    # has already imported what they run
+    context = multiprocessing.get_context()
+    if context.get_start_method() == "fork":
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD)
+    return context
+
+
+def start_server():
+    # the first worker waits for the fork server to import everything, on
+    # the event loop, so it is best started before anything needs a worker
+    if process_context().get_start_method() == "forkserver":
+        multiprocessing.forkserver.ensure_running()
+
+
+def process_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers, mp_context=process_context())
+
+
+class Pool:
+    def __init__(self, make_executor):
+        self.__make_executor = make_executor
+        self.__executor: Executor | None = None
+        # jobs handed to the pool that have not finished yet
+        self.pending = 0
+        self.peak = 0
+        self.completed = 0
+
+    def __get_executor(self) -> Executor:
+        if self.__executor is None:
+            self.__executor = self.__make_executor()
+        return self.__executor
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        job = functools.partial(func, *args, **kwargs)
+        self.pending += 1
+        self.peak = max(self.peak, self.pending)
+        try:
+            return await loop.run_in_executor(self.__get_executor(), job)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Workers:
+    # threads for work that waits on something, processes for work that
+    # would otherwise hold the GIL; anything sent to a process has to pickle
+    def __init__(self, threads: int = 0, processes: int = 0):
+        # 0 leaves the size to concurrent.futures
+        self.threads = Pool(lambda: ThreadPoolExecutor(threads or None))
+        self.processes = Pool(lambda: process_pool(processes or None))
+
+    async def thread(self, func, *args, **kwargs):
+        return await self.threads.run(func, *args, **kwargs)
+
+    async def process(self, func, *args, **kwargs):
+        return await self.processes.run(func, *args, **kwargs)
+
+    def metrics(self) -> dict:
+        pools = {"threads": self.threads, "processes": self.processes}
+        return {
+            name: {
+                "pending": pool.pending,
+                "peak": pool.peak,
+                "completed": pool.completed,
+            }
+            for name, pool in pools.items()
+        }
+
+    def close(self):
+        self.threads.close()
+        self.processes.close()
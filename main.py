@@ -1,30 +1,28 @@
+import asyncio
 import logging
 
 import interactions
 from interactions.ext import wait_for
 
-from lib import constants, misc
-
 synced: bool = False
-discord_token = constants.CONFIG.tokens.get("discord", "")
-constants.CONFIG.set_logs()
-
-bot = interactions.Client(token=discord_token)
+bot: interactions.Client
 
-bot.load("interactions.ext.files")
-wait_for.setup(bot)
 
-
-@bot.event
 async def on_ready():
+    global synced
     # just in case i need to do something on start
     if not synced:
-        pass
+        constants.SHEETS.start()
+        spells.SPELL_LIST.start()
+        simulate.SIMULATOR.start()
+        await metrics.METRICS.start(
+            constants.CONFIG.metrics_host, constants.CONFIG.metrics_port
+        )
+        synced = True
     name = f"Logged in as {bot.me.name}"
     logging.critical(name)
 
 
-@bot.event
 async def on_command(ctx: interactions.CommandContext):
     try:
         discrim = ctx.author.user.discriminator
@@ -37,9 +35,34 @@ async def on_command(ctx: interactions.CommandContext):
     logging.info(command + by + place)
 
 
-bot.load("commands.base")
-bot.load("commands.rolls")
-bot.load("commands.modify")
-bot.load("commands.unstable")
-bot.load("commands.autocomplete")
-bot.start()
+# worker processes import this file again, and must neither start a second
+# bot nor load the sheets, so nothing from lib is imported until here
+if __name__ == "__main__":
+    from lib import constants, dice, metrics, misc, simulate, spells, workers
+
+    workers.start_server()
+    discord_token = constants.CONFIG.tokens.get("discord", "")
+    constants.CONFIG.set_logs()
+
+    bot = interactions.Client(token=discord_token)
+
+    bot.load("interactions.ext.files")
+    wait_for.setup(bot)
+    bot.event(on_ready)
+    bot.event(on_command)
+
+    bot.load("commands.base")
+    bot.load("commands.rolls")
+    bot.load("commands.modify")
+    bot.load("commands.unstable")
+    bot.load("commands.autocomplete")
+    try:
+        bot.start()
+    finally:
+        # pending sheet edits are saved however the bot stops, ctrl+c included
+        constants.SHEETS.flush_sync()
+        constants.WORKERS.close()
+        dice.ROLLERS.close()
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(constants.WEB.close())
+        loop.run_until_complete(metrics.METRICS.close())
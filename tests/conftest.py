@@ -0,0 +1,30 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CONFIG = """
+[owner]
+id = 0
+servers = []
+
+[tokens]
+discord = ""
+
+[log]
+level = "WARN"
+
+[barred]
+users = []
+"""
+
+# lib reads Config.toml and keeps its sheets in the working directory, so
+# the tests get a throwaway one before anything from lib is imported
+WORKDIR = tempfile.mkdtemp(prefix="walze-tests-")
+Path(WORKDIR, "Config.toml").write_text(CONFIG, encoding="utf-8")
+os.chdir(WORKDIR)
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
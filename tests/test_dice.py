@@ -0,0 +1,156 @@
+import itertools
+import random
+
+import pytest
+import rolldice.rolldice
+
+from lib import dice
+
+# every piece of syntax the engine took over from rolldice
+SYNTAX = [
+    "1d20",
+    "d20",
+    "4d6",
+    "4d6K3",
+    "4d6k1",
+    "2d20K",
+    "2d20k",
+    "5d10X2",
+    "5d10x2",
+    "4d6r",
+    "4d6r2",
+    "6d6!",
+    "3d6!5",
+    "4d6a2",
+    "4d6s1",
+    "3d6m2",
+    "2d%",
+    "d%",
+    "(1d6+2)*3",
+    "-1d6+4",
+    "2*-1d6",
+    "-(1d6+1)",
+    "--1d6",
+    "+1d6",
+    "1d6--2",
+    "1d8+4-1d6*1d6/1d6",
+    "10d4K3+2d6-1",
+]
+INVALID = [
+    "0d6",
+    "4d0",
+    "4d6K5",
+    "4d6K0",
+    "2d6R7",
+    "2d6R0",
+    "1d6!7",
+    "4d6X4",
+    "d",
+    "3d",
+    "4d6a",
+    "abc",
+    "1d6!!",
+    "4d6q2",
+    "1d6++",
+    "1d6)",
+    "(1d6",
+    "1d6*/2",
+    "1d6/0",
+    "1d20+",
+]
+# far deeper than anyone would type, and deeper than rolldice will go
+TOO_DEEP = {
+    "terms": "1d6" + "+1" * 1200,
+    "signs": "-" * 1500 + "1d6",
+    "brackets": "(" * 700 + "1d6" + ")" * 700,
+    "bracket past the limit": "(" * 201 + "1d6" + ")" * 201,
+}
+
+
+class Scripted:
+    # stands in for random in both engines, handing out the same faces in
+    # the order they are asked for
+    def __init__(self, draws):
+        self.draws = iter(draws)
+
+    def randint(self, low: int, high: int) -> int:
+        return low + next(self.draws) % (high - low + 1)
+
+    def choices(self, faces, k: int) -> list[int]:
+        return [faces[next(self.draws) % len(faces)] for _ in range(k)]
+
+
+def seeded(seed: int) -> Scripted:
+    rng = random.Random(seed)
+    return Scripted(rng.randrange(1 << 30) for _ in itertools.count())
+
+
+def faces(*values: int) -> Scripted:
+    return Scripted(value - 1 for value in values)
+
+
+def both(monkeypatch, expression: str, make_dice):
+    monkeypatch.setattr(rolldice.rolldice, "random", make_dice())
+    expected = dice._rolldice(expression)
+    monkeypatch.setattr(dice, "random", make_dice())
+    rolled = dice.compile.__wrapped__(expression).roll()
+    return expected, rolled
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("expression", SYNTAX)
+def test_rolls_match_rolldice(monkeypatch, expression, seed):
+    assert dice.compile.__wrapped__(expression).root is not None
+    expected, rolled = both(monkeypatch, expression, lambda: seeded(seed))
+    assert rolled.explanation == expected.explanation
+    assert rolled.total == expected.total
+
+
+# rolldice rerolls one die until it is done before the next, the engine
+# rerolls in rounds, so the same faces only line up when every die is
+# rerolled at most once
+@pytest.mark.parametrize(
+    "expression, rolled",
+    [
+        ("4d6R", [1, 3, 1, 5, 4, 6]),
+        ("4d6R2", [2, 2, 5, 1, 3, 6]),
+        ("3d6R+1d4r2", [1, 6, 1, 2, 5, 2, 3]),
+        ("2d6R", [4, 5]),
+    ],
+)
+def test_rerolls_match_rolldice(monkeypatch, expression, rolled):
+    expected, native = both(monkeypatch, expression, lambda: faces(*rolled))
+    assert native.explanation == expected.explanation
+    assert native.total == expected.total
+
+
+@pytest.mark.parametrize("expression", INVALID)
+def test_errors_match_rolldice(expression):
+    with pytest.raises(dice.DiceError) as expected:
+        dice._rolldice(expression)
+    with pytest.raises(dice.DiceError) as raised:
+        dice.compile.__wrapped__(expression).roll()
+    assert type(raised.value) is type(expected.value)
+    assert str(raised.value) == str(expected.value)
+
+
+@pytest.mark.parametrize("expression", TOO_DEEP.values(), ids=TOO_DEEP)
+def test_depth_errors_match_rolldice(expression):
+    test_errors_match_rolldice(expression)
+
+
+@pytest.mark.parametrize("depth", [100, 200])
+def test_nesting_rolldice_allows_is_rolled(depth):
+    expression = "(" * depth + "1d6" + ")" * depth
+    dice.compile.__wrapped__(expression).roll()
+    dice._rolldice(expression)
+
+
+# rolldice would spend seconds rolling these again and again
+@pytest.mark.parametrize(
+    "expression",
+    ["1d100000!>1", "1d200000R<199999", "1d100000!p<100000", "1000000D6"],
+)
+def test_fallbacks_that_roll_again_are_budgeted(expression):
+    with pytest.raises(dice.DiceBudgetError):
+        dice.compile.__wrapped__(expression)
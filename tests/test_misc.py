@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from lib import misc
+
+WORDS = ["fire", "ball", "zephyr", "blaze.", "arcane", "b", "the", "a."]
+
+
+def description(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+@pytest.mark.parametrize("limit", [6000, 5000, 2100, 1100, 1030, 300])
+def test_spells_are_cut_between_useful_chunks(limit):
+    text = description(3000)
+    chunks = misc.wrap_spell(text, limit=limit)
+    assert sum(map(len, chunks)) <= limit
+    assert all(len(chunk) <= 1024 for chunk in chunks)
+    # no stub of a word in an embed of its own
+    assert all(len(chunk) >= min(256, limit) for chunk in chunks)
+    assert chunks[-1].endswith("\u2026")
+    assert all(not chunk.endswith("\u2026") for chunk in chunks[:-1])
+    # the ellipsis goes after a whole word or in place of a full stop
+    word = chunks[-1].rsplit(" ", 1)[-1][:-1]
+    assert word + "." in WORDS or word in WORDS
+
+
+def test_early_sentence_break_is_ignored():
+    chunks = misc.wrap_spell("a. " + "word " * 400)
+    assert len(chunks[0]) > 512
+
+
+def test_spells_that_fit_are_left_whole():
+    text = description(500)
+    chunks = misc.wrap_spell(text)
+    assert " ".join(chunks).split() == text.split()
+    assert not chunks[-1].endswith("\u2026")
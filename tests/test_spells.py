@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from lib import spells
+
+
+@pytest.mark.parametrize(
+    "spell, slug",
+    [
+        ("Fireball", "fireball"),
+        ("Tasha's Hideous Laughter", "tashas-hideous-laughter"),
+        ("Antipathy/Sympathy", "antipathy-sympathy"),
+        ("../stats", "-stats"),
+        ("..\\..\\Config.toml", "configtoml"),
+    ],
+)
+def test_slugs_stay_in_the_cache(spell, slug):
+    assert spells.slugify(spell) == slug
+
+
+@pytest.mark.parametrize("cached", [[1, 2], {"name": "Fireball"}, "spell"])
+def test_foreign_cache_files_are_misses(tmp_path, cached):
+    cache = spells.SpellCache(str(tmp_path), ttl=60)
+    (tmp_path / "fireball.json").write_text(json.dumps(cached))
+    assert cache._SpellCache__from_disk("fireball") is None
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from lib import workers
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_worker_modules_leave_the_sheets_alone():
+    # a fresh interpreter, the way a spawned or fork server worker starts
+    imports = "; ".join(f"import {module}" for module in workers.PRELOAD)
+    check = "import sys; print('lib.constants' in sys.modules)"
+    loaded = subprocess.run(
+        [sys.executable, "-c", f"{imports}; {check}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+    )
+    assert loaded.stdout.strip() == "False"